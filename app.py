@@ -4,31 +4,127 @@ A gamified study tracking web app for students
 Congressional App Challenge 2025
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response
-from datetime import datetime, timedelta
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, make_response, session as flask_session
+from email.utils import formatdate
+import gzip
+import hashlib
 import os
-from models import db, User, StudySession, Streak, Badge, UserBadge, create_default_badges
+import threading
+import time
+from pathlib import Path
+from sqlite3 import Connection as SQLite3Connection
+from sqlalchemy import delete, event, lambda_stmt, select
+from sqlalchemy.orm import selectinload
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.security import safe_join
+from models import db, User, StudySession, Streak, Badge, UserBadge, create_default_badges, ensure_indexes
+from db_utils import (get_dashboard_data, get_study_history_data, get_badge_stats, create_study_session,
+                      check_and_award_badges, update_streak, get_month_session_marker,
+                      get_all_badges)
+from streak_calculator import get_streak_status, get_streak_calendar_data, streak_calculator
+from badge_engine import invalidate_badge_progress
+
+try:
+    import orjson
+except ImportError:  # Fall back to Flask's stdlib json provider
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson, deferring anything it can't handle to Flask's default"""
+    option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS |
+              orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # Formatting options (indent, separators) are only honoured by the stdlib encoder
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Pretty-printed output in debug mode goes through the stdlib path
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 # Create Flask application instance
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Instance folder holding the SQLite database, resolved once at import
+INSTANCE_DIR = Path('instance').resolve()
 
 # Configuration settings
 app.config['SECRET_KEY'] = 'your-secret-key-change-this-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath("instance/study_app.db")}'
+# DATABASE_URL overrides the file database, e.g. sqlite:///:memory: for the test suite
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+    'DATABASE_URL', f'sqlite:///{INSTANCE_DIR / "study_app.db"}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep enough pooled connections for the threaded server so each request reuses an already
+# PRAGMA-tuned connection; pre-ping/recycle are skipped since SQLite connections don't go stale.
+# In-memory databases get Flask-SQLAlchemy's single static connection instead
+if ':memory:' not in app.config['SQLALCHEMY_DATABASE_URI']:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': 10, 'max_overflow': 20}
 # Disable static caching in debug to ensure newest JS/CSS are loaded
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+# gzip settings for HTML and JSON responses (see compress_response)
+app.config['COMPRESS_MIMETYPES'] = ('text/html', 'application/json')
+app.config['COMPRESS_MIN_SIZE'] = 512
+app.config['COMPRESS_LEVEL'] = 5
 
 # Initialize the database with the app
 db.init_app(app)
 
-# Create instance folder if it doesn't exist
-os.makedirs('instance', exist_ok=True)
+def enable_nplusone(app):
+    """
+    Log lazy loads (N+1 queries) and unused eager loads in development
+    nplusone is an optional dev dependency; without it this does nothing
+    """
+    try:
+        from nplusone.ext.flask_sqlalchemy import NPlusOne
+    except ImportError:
+        return False
+    # Set NPLUSONE_RAISE=1 to turn each detected lazy load into an exception
+    app.config['NPLUSONE_RAISE'] = os.environ.get('NPLUSONE_RAISE') == '1'
+    NPlusOne(app)
+    return True
+
+if app.debug:
+    enable_nplusone(app)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Tune every new SQLite connection: WAL lets reads run alongside writes and
+    synchronous=NORMAL avoids an fsync on every commit
+    """
+    if not isinstance(dbapi_connection, SQLite3Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    cursor.execute("PRAGMA cache_size=-64000")  # ~64 MB
+    cursor.close()
+
+# Only this app's engine is tuned, not every engine in the process
+with app.app_context():
+    event.listen(db.engine, "connect", set_sqlite_pragmas)
+
+# Create instance folder if it doesn't exist (the debug reloader's child process can skip this)
+if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+    INSTANCE_DIR.mkdir(exist_ok=True)
 
 # Asset version for cache-busting static files in development
 try:
-    import time as _time
-    ASSET_VERSION = str(int(_time.time()))
+    ASSET_VERSION = str(int(time.time()))
 except Exception:
     ASSET_VERSION = "1"
 
@@ -36,6 +132,138 @@ except Exception:
 def inject_asset_version():
     return {'asset_version': ASSET_VERSION}
 
+# One-year Expires header for static files, rebuilt at most once per hour
+STATIC_MAX_AGE = 31536000
+_EXPIRES_CACHE = {'ts': 0, 'val': ''}
+
+def get_static_expires_header():
+    """Return the cached Expires header value for static files"""
+    now = time.time()
+    if now - _EXPIRES_CACHE['ts'] > 3600:
+        _EXPIRES_CACHE['val'] = formatdate(now + STATIC_MAX_AGE, usegmt=True)
+        _EXPIRES_CACHE['ts'] = now
+    return _EXPIRES_CACHE['val']
+
+# Content-hash ETags for static files, keyed by path and refreshed when the file changes
+_STATIC_ETAGS = {}
+
+def get_static_etag(filename):
+    """Return a strong ETag (BLAKE2 hash of the file contents) for a static file"""
+    path = safe_join(app.static_folder, filename)
+    if path is None:
+        return None
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    
+    cached = _STATIC_ETAGS.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        cached = _STATIC_ETAGS[path] = (mtime, digest)
+    return cached[1]
+
+# Rendered index.html body; the page has no per-user data, so it is rendered once and reused
+_INDEX_HTML = {'body': None}
+
+def render_index(status=200):
+    """Return the home page as a response, reusing the cached render when possible"""
+    # Flash messages are rendered into the page, and debug mode picks up template edits.
+    # Error pages use the cached body even with flashes pending; they stay queued for the next page.
+    has_flashes = '_flashes' in flask_session
+    if app.debug or (has_flashes and (status == 200 or _INDEX_HTML['body'] is None)):
+        return make_response(render_template('index.html'), status)
+    if _INDEX_HTML['body'] is None:
+        _INDEX_HTML['body'] = render_template('index.html').encode('utf-8')
+    return make_response(_INDEX_HTML['body'], status)
+
+# Suffix that marks the ETag of a gzipped body, so it never matches the identity body's
+GZIP_ETAG_SUFFIX = '-gz'
+
+def compress_response(response):
+    """gzip HTML and JSON bodies when the client accepts it and the body is large enough"""
+    if response.mimetype not in app.config['COMPRESS_MIMETYPES']:
+        return response
+    # The body depends on Accept-Encoding whether or not this one gets compressed
+    response.vary.add('Accept-Encoding')
+    
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.accept_encodings):
+        return response
+    
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    
+    response.set_data(gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(etag + GZIP_ETAG_SUFFIX, weak)
+    return response
+
+def matching_etag(etag):
+    """The request's If-None-Match entry for either the identity or the gzipped body, if any"""
+    for candidate in (etag, etag + GZIP_ETAG_SUFFIX):
+        if candidate in request.if_none_match:
+            return candidate
+    return None
+
+# Rendered dashboard HTML per (user, template), kept briefly since study data rarely changes mid-visit.
+# Entries sit in write order, so expired and least recently written ones are at the front
+DASHBOARD_CACHE_TTL = 10
+DASHBOARD_CACHE_MAXSIZE = 256
+_DASHBOARD_CACHE = {}
+# Bumped on every invalidation so a render that overlapped a session change isn't cached
+_DASHBOARD_CACHE_VERSION = [0]
+# The threaded server reads and writes the cache from several requests at once
+_DASHBOARD_CACHE_LOCK = threading.Lock()
+
+def render_dashboard(template, user_id):
+    """Render a dashboard template for a user, reusing a render from the last few seconds"""
+    cacheable = not app.debug and '_flashes' not in flask_session
+    key = (user_id, template)
+    now = time.monotonic()
+    
+    with _DASHBOARD_CACHE_LOCK:
+        cached = _DASHBOARD_CACHE.get(key) if cacheable else None
+        version = _DASHBOARD_CACHE_VERSION[0]
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    dashboard_data = get_dashboard_data(user_id)
+    if not dashboard_data:
+        flash('User not found. Please initialize the database.', 'error')
+        return redirect(url_for('index'))
+    
+    html = render_template(template, data=dashboard_data)
+    if cacheable:
+        store_dashboard_render(key, now, html, version)
+    return html
+
+def store_dashboard_render(key, now, html, version):
+    """
+    Cache a render unless the cache was invalidated since `version` was read,
+    first evicting expired entries and then the oldest beyond the size limit
+    """
+    with _DASHBOARD_CACHE_LOCK:
+        if version != _DASHBOARD_CACHE_VERSION[0]:
+            return
+        _DASHBOARD_CACHE.pop(key, None)
+        for oldest_key, (expires_at, _) in list(_DASHBOARD_CACHE.items()):
+            if expires_at > now and len(_DASHBOARD_CACHE) < DASHBOARD_CACHE_MAXSIZE:
+                break
+            _DASHBOARD_CACHE.pop(oldest_key, None)
+        _DASHBOARD_CACHE[key] = (now + DASHBOARD_CACHE_TTL, html)
+
+def invalidate_dashboard_cache(user_id):
+    """Drop cached dashboard renders for a user after their sessions change"""
+    with _DASHBOARD_CACHE_LOCK:
+        _DASHBOARD_CACHE_VERSION[0] += 1
+        for key in [key for key in list(_DASHBOARD_CACHE) if key[0] == user_id]:
+            _DASHBOARD_CACHE.pop(key, None)
 
 
 # Performance optimizations
@@ -44,13 +272,20 @@ def after_request(response):
     """Add performance headers to all responses"""
     # Cache static files (disabled in debug)
     if request.path.startswith('/static/'):
+        # Content-based ETag so revalidation returns 304 instead of the full file
+        if request.endpoint == 'static' and response.status_code == 200:
+            etag = get_static_etag(request.view_args['filename'])
+            if etag:
+                response.set_etag(etag)
+                response.make_conditional(request)
+        
         if app.debug:
             response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
             response.headers['Pragma'] = 'no-cache'
             response.headers['Expires'] = '0'
         else:
-            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-            response.headers['Expires'] = (datetime.now() + timedelta(days=365)).strftime('%a, %d %b %Y %H:%M:%S GMT')
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+            response.headers['Expires'] = get_static_expires_header()
     else:
         # Disable caching for HTML responses during development to prevent stale pages
         if 'text/html' in response.headers.get('Content-Type', ''):
@@ -66,7 +301,7 @@ def after_request(response):
     # Performance headers
     response.headers['Vary'] = 'Accept-Encoding'
     
-    return response
+    return compress_response(response)
 
 @app.route('/')
 def index():
@@ -74,7 +309,7 @@ def index():
     Home page route - Welcome page for new users
     Shows project introduction and motivation to start studying
     """
-    return render_template('index.html')
+    return render_index()
 
 @app.route('/dashboard')
 def dashboard():
@@ -82,17 +317,9 @@ def dashboard():
     Dashboard route - Main user interface showing real database data
     Shows study streaks, badges, and progress from Phase 2
     """
-    from db_utils import get_dashboard_data
-    
     # Get the default user for now (in Phase 4+ we'll add proper user sessions)
     user_id = 1  # Default 'student' user
-    dashboard_data = get_dashboard_data(user_id)
-    
-    if not dashboard_data:
-        flash('User not found. Please initialize the database.', 'error')
-        return redirect(url_for('index'))
-    
-    return render_template('dashboard.html', data=dashboard_data)
+    return render_dashboard('dashboard.html', user_id)
 
 @app.route('/dashboard/enhanced')
 def dashboard_enhanced():
@@ -100,17 +327,9 @@ def dashboard_enhanced():
     Enhanced Dashboard route - Phase 5 advanced analytics dashboard
     Shows interactive charts, detailed analytics, and smart insights
     """
-    from db_utils import get_dashboard_data
-    
     # Get the default user for now (in Phase 4+ we'll add proper user sessions)
     user_id = 1  # Default 'student' user
-    dashboard_data = get_dashboard_data(user_id)
-    
-    if not dashboard_data:
-        flash('User not found. Please initialize the database.', 'error')
-        return redirect(url_for('index'))
-    
-    return render_template('dashboard_enhanced.html', data=dashboard_data)
+    return render_dashboard('dashboard_enhanced.html', user_id)
 
 @app.route('/timer')
 def timer():
@@ -127,8 +346,6 @@ def study_history():
     Study History route - Detailed view of all study sessions
     Phase 5 feature with filtering and search capabilities
     """
-    from db_utils import get_study_history_data
-    
     # Get the default user for now
     user_id = 1  # Default 'student' user
     history_data = get_study_history_data(user_id)
@@ -139,31 +356,35 @@ def study_history():
     
     return render_template('history.html', data=history_data)
 
+def earned_badges_stmt(user_id):
+    """Earned badges for a user, with their Badge rows loaded up front; user_id is a bound parameter"""
+    return lambda_stmt(lambda: select(UserBadge)
+                       .options(selectinload(UserBadge.badge))
+                       .where(UserBadge.user_id == user_id))
+
 @app.route('/badges')
 def badges():
     """Badge Collection page - Phase 6/7 enhancement."""
     try:
-        # Get all badges
-        all_badges = Badge.query.order_by(Badge.category, Badge.tier, Badge.name).all()
+        # All badges for the collection grid, from the in-memory catalog
+        all_badges = get_all_badges()
         
-        # Get earned badges for user 1 (test user)
-        earned_user_badges = UserBadge.query.filter_by(user_id=1).all()
+        # Get earned badges for user 1 (test user), loading their Badge rows up front
+        earned_user_badges = db.session.execute(earned_badges_stmt(1)).scalars().all()
         earned_badge_ids = {ub.badge_id for ub in earned_user_badges}
         earned_badges_dict = {ub.badge_id: ub for ub in earned_user_badges}
         
-        # Calculate badge statistics
-        total_points = sum(badge.points for badge in all_badges if badge.id in earned_badge_ids)
-        completion_percentage = round((len(earned_badge_ids) / len(all_badges)) * 100) if all_badges else 0
-        rare_badges_count = len([b for b in all_badges if b.rarity in ['epic', 'legendary'] and b.id in earned_badge_ids])
+        # Calculate badge statistics in the database instead of looping in Python
+        badge_stats = get_badge_stats(1)
         
         return render_template('badges.html',
                              badges=all_badges,
                              earned_badges=earned_user_badges,
                              earned_badge_ids=earned_badge_ids,
                              earned_badges_dict=earned_badges_dict,
-                             total_points=total_points,
-                             completion_percentage=completion_percentage,
-                             rare_badges_count=rare_badges_count)
+                             total_points=badge_stats['total_points'],
+                             completion_percentage=badge_stats['completion_percentage'],
+                             rare_badges_count=badge_stats['rare_badges_count'])
     except Exception as e:
         print(f"Badge collection error: {e}")
         # Fallback for when database isn't initialized
@@ -186,6 +407,8 @@ def init_database():
         with app.app_context():
             # Create all tables
             db.create_all()
+            ensure_indexes()
+            _DASHBOARD_CACHE.clear()
             
             # Create default badges
             create_default_badges()
@@ -248,8 +471,6 @@ def start_timer_session():
     """
     Start a new study session
     """
-    from db_utils import create_study_session
-    
     try:
         data = request.get_json()
         subject = data.get('subject', 'Math')
@@ -261,6 +482,7 @@ def start_timer_session():
         
         # Create study session
         session = create_study_session(user_id, subject, duration)
+        invalidate_dashboard_cache(user_id)
         
         return jsonify({
             'status': 'success',
@@ -280,8 +502,6 @@ def complete_timer_session():
     """
     Complete a study session and update progress
     """
-    from db_utils import complete_study_session, check_and_award_badges, update_streak
-    
     try:
         data = request.get_json()
         session_id = data.get('session_id')
@@ -302,21 +522,23 @@ def complete_timer_session():
                 'message': 'Session not found'
             }), 404
             
-        # Update session details
+        # Update session details (committed together with streak and badge changes below)
         session.duration_minutes = duration
         session.completed = completed
-        db.session.commit()
         
-        # Update streak if session was completed
-        streak_update_info = {}
+        # Update streak and check for new badges if session was completed;
+        # badges only count completed sessions, so an abandoned one can't earn any
+        streak_status = None
+        new_badges = []
         if completed:
-            from streak_calculator import get_streak_status
-            streak_update_info = update_streak(session.user_id)
+            update_streak(session.user_id, commit=False)
             # Get full streak status for response
             streak_status = get_streak_status(session.user_id)
-            
-        # Check for new badges
-        new_badges = check_and_award_badges(session.user_id)
+            new_badges = check_and_award_badges(session.user_id, commit=False)
+        
+        # Single commit for the whole completion
+        db.session.commit()
+        invalidate_dashboard_cache(session.user_id)
         
         response_data = {
             'status': 'success',
@@ -334,7 +556,7 @@ def complete_timer_session():
         }
         
         # Add streak information if session was completed
-        if completed and 'streak_status' in locals():
+        if streak_status is not None:
             response_data['streak'] = {
                 'current_streak': streak_status['current_streak'],
                 'longest_streak': streak_status['longest_streak'],
@@ -345,29 +567,51 @@ def complete_timer_session():
         return jsonify(response_data)
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'status': 'error',
             'message': f'Failed to complete session: {str(e)}'
         }), 500
 
+# Cache-Control for calendar months that have already ended: browsers keep the data but
+# revalidate it with the ETag each time, so an edited past session shows up at once
+PAST_MONTH_CACHE_CONTROL = 'private, no-cache'
+
 @app.route('/api/calendar-data')
 def get_calendar_data():
     """
     Get calendar data for study activity visualization
+    Past months rarely change, so they get an ETag built from their daily totals and a 304 when unchanged
     """
-    from streak_calculator import get_streak_calendar_data
-    
     try:
         year = request.args.get('year', type=int)
         month = request.args.get('month', type=int)
         user_id = 1  # Default user for now
         
+        etag = None
+        if year and month:
+            today = streak_calculator.get_local_date()
+            if (year, month) < (today.year, today.month):
+                marker = get_month_session_marker(user_id, year, month,
+                                                  streak_calculator.min_study_minutes)
+                etag = hashlib.blake2b(repr((user_id, year, month, marker)).encode(), digest_size=16).hexdigest()
+                not_modified_etag = matching_etag(etag)
+                if not_modified_etag:
+                    response = app.response_class(status=304, mimetype='application/json')
+                    response.set_etag(not_modified_etag)
+                    response.headers['Cache-Control'] = PAST_MONTH_CACHE_CONTROL
+                    return response
+        
         calendar_data = get_streak_calendar_data(user_id, year, month)
         
-        return jsonify({
+        response = jsonify({
             'status': 'success',
             'calendar_data': calendar_data
         })
+        if etag:
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = PAST_MONTH_CACHE_CONTROL
+        return response
         
     except Exception as e:
         return jsonify({
@@ -380,8 +624,6 @@ def get_streak_info(user_id):
     """
     Get comprehensive streak information for a user
     """
-    from streak_calculator import get_streak_status, get_streak_calendar_data
-    
     try:
         streak_status = get_streak_status(user_id)
         calendar_data = get_streak_calendar_data(user_id)
@@ -404,10 +646,14 @@ def cancel_timer_session(session_id):
     Cancel a study session (delete it from database)
     """
     try:
-        session = db.session.get(StudySession, session_id)
-        if session:
-            db.session.delete(session)
-            db.session.commit()
+        # One DELETE statement, without loading the session first
+        deleted_user_ids = db.session.execute(
+            delete(StudySession).where(StudySession.id == session_id).returning(StudySession.user_id)
+        ).scalars().all()
+        db.session.commit()
+        for user_id in deleted_user_ids:
+            invalidate_dashboard_cache(user_id)
+            invalidate_badge_progress(user_id)
             
         return jsonify({
             'status': 'success',
@@ -424,15 +670,17 @@ def cancel_timer_session(session_id):
 @app.errorhandler(404)
 def page_not_found(error):
     """Handle 404 errors with a friendly message"""
-    return render_template('index.html'), 404
+    return render_index(404)
 
 @app.errorhandler(500)
 def internal_server_error(error):
     """Handle 500 errors gracefully"""
-    return render_template('index.html'), 500
+    return render_index(500)
 
 # Run the application in development mode
 if __name__ == '__main__':
     # Debug mode enabled for development
     # In production, set debug=False
+    if not app.debug:  # Already enabled at import when FLASK_DEBUG is set
+        enable_nplusone(app)
     app.run(debug=True, host='127.0.0.1', port=3333)
@@ -5,6 +5,7 @@ Congressional App Challenge 2025
 """
 
 import json
+from typing import NamedTuple, Optional, Tuple
 
 # Badge Categories
 CATEGORIES = {
@@ -32,9 +33,44 @@ RARITY = {
     'legendary': {'multiplier': 3.0}
 }
 
-def get_comprehensive_badges():
+# Points for every tier/rarity combination
+POINTS = {
+    (tier, rarity): int(tier_data['points'] * rarity_data['multiplier'])
+    for tier, tier_data in TIERS.items()
+    for rarity, rarity_data in RARITY.items()
+}
+
+class BadgeDef(NamedTuple):
+    """A static badge definition; fields match the Badge columns used for seeding"""
+    name: str
+    description: str
+    icon: str
+    category: str
+    tier: str
+    rarity: str
+    criteria_type: str
+    criteria_value: int
+    color: str
+    points: int
+    criteria_details: Optional[str] = None
+    is_secret: bool = False
+
+# Serialized criteria_details payloads, encoded once at import
+_CD_SUBJECT_MATH = json.dumps({'subject': 'Math'})
+_CD_SUBJECT_SCIENCE = json.dumps({'subject': 'Science'})
+_CD_SUBJECT_ENGLISH = json.dumps({'subject': 'English'})
+_CD_SUBJECT_HISTORY = json.dumps({'subject': 'History'})
+_CD_NIGHT_OWL = json.dumps({'condition': 'study_after_hour', 'hour': 21})
+_CD_EARLY_BIRD = json.dumps({'condition': 'study_before_hour', 'hour': 7})
+_CD_WEEKEND_SESSIONS = json.dumps({'condition': 'weekend_sessions'})
+_CD_SINGLE_SESSION_DURATION = json.dumps({'condition': 'single_session_duration'})
+_CD_SUBJECTS_IN_WEEK = json.dumps({'condition': 'subjects_in_week', 'subjects': ['Math', 'Science', 'English', 'History']})
+_CD_EARN_ALL_COMMON_RARE = json.dumps({'condition': 'earn_all_badges', 'rarities': ['common', 'rare']})
+
+def _build_badges():
     """
-    Returns a comprehensive list of badge definitions for the achievement system
+    Build the comprehensive list of badge definitions for the achievement system
+    Runs once at import; use get_comprehensive_badges() to read the result
     """
     badges = []
     
@@ -47,6 +83,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'sessions',
             'criteria_value': 1,
             'color': '#4285f4'
@@ -58,6 +95,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'streak',
             'criteria_value': 2,
             'color': '#ff9800'
@@ -69,6 +107,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'streak',
             'criteria_value': 3,
             'color': '#f44336'
@@ -80,6 +119,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'silver',
             'rarity': 'rare',
+            'points': POINTS[('silver', 'rare')],
             'criteria_type': 'streak',
             'criteria_value': 7,
             'color': '#2196f3'
@@ -91,6 +131,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'silver',
             'rarity': 'rare',
+            'points': POINTS[('silver', 'rare')],
             'criteria_type': 'streak',
             'criteria_value': 14,
             'color': '#9c27b0'
@@ -102,6 +143,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'gold',
             'rarity': 'epic',
+            'points': POINTS[('gold', 'epic')],
             'criteria_type': 'streak',
             'criteria_value': 30,
             'color': '#ffd700'
@@ -113,6 +155,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'platinum',
             'rarity': 'epic',
+            'points': POINTS[('platinum', 'epic')],
             'criteria_type': 'streak',
             'criteria_value': 60,
             'color': '#e5e4e2'
@@ -124,6 +167,7 @@ def get_comprehensive_badges():
             'category': 'streak',
             'tier': 'legendary',
             'rarity': 'legendary',
+            'points': POINTS[('legendary', 'legendary')],
             'criteria_type': 'streak',
             'criteria_value': 100,
             'color': '#9400d3',
@@ -140,6 +184,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'time',
             'criteria_value': 60,
             'color': '#4caf50'
@@ -151,6 +196,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'time',
             'criteria_value': 300,
             'color': '#4caf50'
@@ -162,6 +208,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'time',
             'criteria_value': 1200,
             'color': '#607d8b'
@@ -173,6 +220,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'silver',
             'rarity': 'rare',
+            'points': POINTS[('silver', 'rare')],
             'criteria_type': 'time',
             'criteria_value': 3000,
             'color': '#3f51b5'
@@ -184,6 +232,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'gold',
             'rarity': 'rare',
+            'points': POINTS[('gold', 'rare')],
             'criteria_type': 'time',
             'criteria_value': 6000,
             'color': '#ff9800'
@@ -195,6 +244,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'platinum',
             'rarity': 'epic',
+            'points': POINTS[('platinum', 'epic')],
             'criteria_type': 'time',
             'criteria_value': 12000,
             'color': '#673ab7'
@@ -206,6 +256,7 @@ def get_comprehensive_badges():
             'category': 'time',
             'tier': 'legendary',
             'rarity': 'legendary',
+            'points': POINTS[('legendary', 'legendary')],
             'criteria_type': 'time',
             'criteria_value': 30000,
             'color': '#e91e63',
@@ -222,6 +273,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'bronze',
             'rarity': 'common',
+            'points': POINTS[('bronze', 'common')],
             'criteria_type': 'sessions',
             'criteria_value': 10,
             'color': '#4caf50'
@@ -233,6 +285,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'sessions',
             'criteria_value': 25,
             'color': '#2196f3'
@@ -244,6 +297,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'silver',
             'rarity': 'rare',
+            'points': POINTS[('silver', 'rare')],
             'criteria_type': 'sessions',
             'criteria_value': 50,
             'color': '#ff5722'
@@ -255,6 +309,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'gold',
             'rarity': 'rare',
+            'points': POINTS[('gold', 'rare')],
             'criteria_type': 'sessions',
             'criteria_value': 100,
             'color': '#ffc107'
@@ -266,6 +321,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'platinum',
             'rarity': 'epic',
+            'points': POINTS[('platinum', 'epic')],
             'criteria_type': 'sessions',
             'criteria_value': 250,
             'color': '#9c27b0'
@@ -277,6 +333,7 @@ def get_comprehensive_badges():
             'category': 'consistency',
             'tier': 'legendary',
             'rarity': 'legendary',
+            'points': POINTS[('legendary', 'legendary')],
             'criteria_type': 'sessions',
             'criteria_value': 500,
             'color': '#e91e63',
@@ -293,10 +350,11 @@ def get_comprehensive_badges():
             'category': 'subject',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'subject_time',
             'criteria_value': 600,
             'color': '#3f51b5',
-            'criteria_details': json.dumps({'subject': 'Math'})
+            'criteria_details': _CD_SUBJECT_MATH
         },
         {
             'name': 'Science Explorer',
@@ -305,10 +363,11 @@ def get_comprehensive_badges():
             'category': 'subject',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'subject_time',
             'criteria_value': 600,
             'color': '#4caf50',
-            'criteria_details': json.dumps({'subject': 'Science'})
+            'criteria_details': _CD_SUBJECT_SCIENCE
         },
         {
             'name': 'Language Master',
@@ -317,10 +376,11 @@ def get_comprehensive_badges():
             'category': 'subject',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'subject_time',
             'criteria_value': 600,
             'color': '#ff9800',
-            'criteria_details': json.dumps({'subject': 'English'})
+            'criteria_details': _CD_SUBJECT_ENGLISH
         },
         {
             'name': 'History Scholar',
@@ -329,10 +389,11 @@ def get_comprehensive_badges():
             'category': 'subject',
             'tier': 'silver',
             'rarity': 'common',
+            'points': POINTS[('silver', 'common')],
             'criteria_type': 'subject_time',
             'criteria_value': 600,
             'color': '#795548',
-            'criteria_details': json.dumps({'subject': 'History'})
+            'criteria_details': _CD_SUBJECT_HISTORY
         }
     ]
     
@@ -345,10 +406,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'gold',
             'rarity': 'rare',
+            'points': POINTS[('gold', 'rare')],
             'criteria_type': 'special',
             'criteria_value': 5,
             'color': '#3f51b5',
-            'criteria_details': json.dumps({'condition': 'study_after_hour', 'hour': 21})
+            'criteria_details': _CD_NIGHT_OWL
         },
         {
             'name': 'Early Bird',
@@ -357,10 +419,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'gold',
             'rarity': 'rare',
+            'points': POINTS[('gold', 'rare')],
             'criteria_type': 'special',
             'criteria_value': 5,
             'color': '#ff9800',
-            'criteria_details': json.dumps({'condition': 'study_before_hour', 'hour': 7})
+            'criteria_details': _CD_EARLY_BIRD
         },
         {
             'name': 'Weekend Warrior',
@@ -369,10 +432,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'gold',
             'rarity': 'rare',
+            'points': POINTS[('gold', 'rare')],
             'criteria_type': 'special',
             'criteria_value': 10,
             'color': '#e91e63',
-            'criteria_details': json.dumps({'condition': 'weekend_sessions'})
+            'criteria_details': _CD_WEEKEND_SESSIONS
         },
         {
             'name': 'Focus Master',
@@ -381,10 +445,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'gold',
             'rarity': 'epic',
+            'points': POINTS[('gold', 'epic')],
             'criteria_type': 'special',
             'criteria_value': 120,
             'color': '#4caf50',
-            'criteria_details': json.dumps({'condition': 'single_session_duration'})
+            'criteria_details': _CD_SINGLE_SESSION_DURATION
         },
         {
             'name': 'Diversity Champion',
@@ -393,10 +458,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'platinum',
             'rarity': 'epic',
+            'points': POINTS[('platinum', 'epic')],
             'criteria_type': 'special',
             'criteria_value': 4,
             'color': '#9c27b0',
-            'criteria_details': json.dumps({'condition': 'subjects_in_week', 'subjects': ['Math', 'Science', 'English', 'History']})
+            'criteria_details': _CD_SUBJECTS_IN_WEEK
         },
         {
             'name': 'The Completionist',
@@ -405,10 +471,11 @@ def get_comprehensive_badges():
             'category': 'special',
             'tier': 'legendary',
             'rarity': 'legendary',
+            'points': POINTS[('legendary', 'legendary')],
             'criteria_type': 'special',
             'criteria_value': 1,
             'color': '#ffd700',
-            'criteria_details': json.dumps({'condition': 'earn_all_badges', 'rarities': ['common', 'rare']}),
+            'criteria_details': _CD_EARN_ALL_COMMON_RARE,
             'is_secret': True
         }
     ]
@@ -420,58 +487,103 @@ def get_comprehensive_badges():
     badges.extend(subject_badges)
     badges.extend(special_badges)
     
-    # Calculate points based on tier and rarity
-    for badge in badges:
-        tier_points = TIERS.get(badge['tier'], {'points': 10})['points']
-        rarity_multiplier = RARITY.get(badge['rarity'], {'multiplier': 1.0})['multiplier']
-        badge['points'] = int(tier_points * rarity_multiplier)
-    
     return badges
 
-def create_advanced_badges():
+# Badge definitions are static, so they are built once when the module loads
+_BADGE_DEFINITIONS = tuple(BadgeDef(**badge) for badge in _build_badges())
+
+def get_badge_definitions() -> Tuple[BadgeDef, ...]:
     """
-    Create all advanced badges in the database
-    Enhanced version of create_default_badges for Phase 6
+    Returns the badge definitions as immutable BadgeDef records
+    """
+    return _BADGE_DEFINITIONS
+
+def get_comprehensive_badges():
     """
+    Returns a comprehensive list of badge definitions for the achievement system
+    """
+    return [badge._asdict() for badge in _BADGE_DEFINITIONS]
+
+# Columns refreshed on existing badges when seeding (name, text and criteria are left as first created)
+UPSERT_COLUMNS = ('category', 'tier', 'rarity', 'points', 'color', 'is_secret', 'criteria_details')
+
+def _upsert_badges(badges, dialect_name):
+    """
+    Insert or refresh all badges with one INSERT ... ON CONFLICT (name) DO UPDATE
+    Rows are only rewritten when a refreshed column actually changed
+    """
+    from datetime import datetime
+    from sqlalchemy import func, or_
     from models import Badge, db
     
-    badges = get_comprehensive_badges()
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    
+    table = Badge.__table__
+    stmt = insert(table)
+    updates = {column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+    # Definitions without criteria_details keep whatever the row already has
+    updates['criteria_details'] = func.coalesce(stmt.excluded.criteria_details, table.c.criteria_details)
+    changed = or_(*(table.c[column].is_distinct_from(value) for column, value in updates.items()))
+    updates['updated_at'] = datetime.utcnow()
     
-    for badge_data in badges:
-        # Check if badge already exists
-        existing_badge = Badge.query.filter_by(name=badge_data['name']).first()
+    stmt = stmt.on_conflict_do_update(index_elements=['name'], set_=updates, where=changed)
+    db.session.execute(stmt, [badge._asdict() for badge in badges])
+
+def _sync_badges(badges):
+    """Insert missing badges and refresh existing ones through the ORM (dialects without upsert)"""
+    from models import Badge, db
+    
+    # Look up every existing badge in one query instead of one per badge
+    names = [badge.name for badge in badges]
+    existing_badges = {badge.name: badge for badge in Badge.query.filter(Badge.name.in_(names)).all()}
+    
+    new_badges = []
+    for badge in badges:
+        existing_badge = existing_badges.get(badge.name)
         if not existing_badge:
-            # Create new badge
-            badge = Badge(
-                name=badge_data['name'],
-                description=badge_data['description'],
-                icon=badge_data['icon'],
-                category=badge_data['category'],
-                tier=badge_data['tier'],
-                rarity=badge_data['rarity'],
-                points=badge_data['points'],
-                criteria_type=badge_data['criteria_type'],
-                criteria_value=badge_data['criteria_value'],
-                criteria_details=badge_data.get('criteria_details'),
-                color=badge_data['color'],
-                is_secret=badge_data.get('is_secret', False)
-            )
-            db.session.add(badge)
+            # Queue new badge for a single bulk insert
+            new_badges.append(badge._asdict())
         else:
             # Update existing badge with new fields if needed
-            existing_badge.category = badge_data.get('category', existing_badge.category)
-            existing_badge.tier = badge_data.get('tier', existing_badge.tier)
-            existing_badge.rarity = badge_data.get('rarity', existing_badge.rarity)
-            existing_badge.points = badge_data.get('points', existing_badge.points)
-            existing_badge.color = badge_data.get('color', existing_badge.color)
-            existing_badge.is_secret = badge_data.get('is_secret', existing_badge.is_secret)
-            if badge_data.get('criteria_details'):
-                existing_badge.criteria_details = badge_data['criteria_details']
+            existing_badge.category = badge.category
+            existing_badge.tier = badge.tier
+            existing_badge.rarity = badge.rarity
+            existing_badge.points = badge.points
+            existing_badge.color = badge.color
+            existing_badge.is_secret = badge.is_secret
+            if badge.criteria_details:
+                existing_badge.criteria_details = badge.criteria_details
+    
+    if new_badges:
+        db.session.bulk_insert_mappings(Badge, new_badges)
+
+def create_advanced_badges():
+    """
+    Create all advanced badges in the database
+    Enhanced version of create_default_badges for Phase 6
+    Safe to run concurrently on SQLite and PostgreSQL, where it is a single upsert
+    """
+    from models import db
+    
+    badges = get_badge_definitions()
+    
+    dialect_name = db.session.get_bind().dialect.name
+    if dialect_name in ('sqlite', 'postgresql'):
+        _upsert_badges(badges, dialect_name)
+    else:
+        _sync_badges(badges)
     
     try:
         db.session.commit()
-        return True
     except Exception as e:
         db.session.rollback()
         print(f"Error creating badges: {e}")
-        return False
\ No newline at end of file
+        return False
+    
+    # Badge rows changed, so the in-memory catalog must be reloaded
+    from db_utils import invalidate_badge_catalog
+    invalidate_badge_catalog()
+    return True
\ No newline at end of file
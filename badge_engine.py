@@ -5,11 +5,60 @@ Congressional App Challenge 2025
 """
 
 import json
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import List, Dict, Set, Tuple
+from flask import g, has_app_context
+from sqlalchemy import Integer, and_, case, cast, event, exists, func, text
+from sqlalchemy.orm import Session
 from models import db, User, StudySession, Streak, Badge, UserBadge
-from db_utils import get_total_study_time, get_user_sessions
-from streak_calculator import get_current_streak
+from db_utils import get_all_badges, get_total_study_time, get_user_sessions, not_earned_by
+from streak_calculator import get_current_streak, streak_calculator
+
+
+def _snapshot_cache() -> Dict[int, 'UserStatsSnapshot']:
+    """Snapshots loaded during the current request, stored on flask.g"""
+    if not has_app_context():
+        return {}
+    return g.setdefault('_badge_snapshot_cache', {})
+
+
+@event.listens_for(Session, 'after_flush')
+@event.listens_for(Session, 'after_commit')
+def _clear_snapshot_cache(session, *args):
+    """Any write may change a user's aggregates, so drop the request's cached snapshots"""
+    if has_app_context():
+        g.pop('_badge_snapshot_cache', None)
+
+
+@dataclass
+class UserStatsSnapshot:
+    """
+    A user's study aggregates, loaded once so badge checks are plain comparisons
+    """
+    user_id: int
+    total_sessions: int = 0
+    total_minutes: int = 0
+    longest_minutes: int = 0
+    current_streak: int = 0
+    subject_minutes: Dict[str, int] = field(default_factory=dict)
+    recent_subjects: Set[str] = field(default_factory=set)  # Subjects studied in the last 7 days
+    hour_counts: Dict[int, int] = field(default_factory=dict)  # Start hour -> session count
+    weekend_count: int = 0  # Distinct weekends (Saturday + Sunday) with a session
+    
+    def sessions_by_hour(self, hour: int, comparison: str) -> int:
+        """Count sessions started at or after / at or before the given hour"""
+        return count_sessions_by_hour(self.hour_counts, hour, comparison)
+
+
+def count_sessions_by_hour(hour_counts: Dict[int, int], hour: int, comparison: str) -> int:
+    """Sum an hour histogram over the hours at or after ('after') / at or before ('before') the given hour"""
+    if comparison == 'after':
+        return sum(count for session_hour, count in hour_counts.items() if session_hour >= hour)
+    return sum(count for session_hour, count in hour_counts.items() if session_hour <= hour)
 
 
 class BadgeEngine:
@@ -25,41 +74,207 @@ class BadgeEngine:
             'subject_time': self.check_subject_time_badges,
             'special': self.check_special_badges
         }
+        # (catalog, predicates) from the last compile_predicates() call
+        self._compiled = None
     
-    def check_and_award_badges(self, user_id: int, trigger_event: str = 'session_complete') -> List[Badge]:
+    def compile_predicates(self) -> Tuple[Tuple, ...]:
+        """
+        Pair each active, non-meta badge of the catalog with its checker
+        
+        Returns:
+            Tuple of (checker, badge) pairs, rebuilt only when the badge catalog is reloaded
+        """
+        catalog = get_all_badges()
+        if self._compiled is not None and self._compiled[0] is catalog:
+            return self._compiled[1]
+        
+        predicates = []
+        for badge in catalog:
+            if not badge.is_active or self.is_meta_badge(badge):
+                continue
+            checker_func = self.badge_checkers.get(badge.criteria_type)
+            if not checker_func:
+                print(f"Unknown badge criteria type: {badge.criteria_type}")
+                continue
+            predicates.append((checker_func, badge))
+        
+        self._compiled = (catalog, tuple(predicates))
+        return self._compiled[1]
+    
+    def load_user_stats(self, user_id: int) -> UserStatsSnapshot:
+        """
+        Load every aggregate the badge checks need in a few grouped queries
+        
+        Args:
+            user_id: User to load stats for
+            
+        Returns:
+            UserStatsSnapshot for the user's completed sessions
+        """
+        cache = _snapshot_cache()
+        if user_id in cache:
+            return cache[user_id]
+        
+        snapshot = UserStatsSnapshot(user_id=user_id)
+        completed = (StudySession.user_id == user_id, StudySession.completed == True)
+        
+        week_end = date.today()
+        week_start = week_end - timedelta(days=6)
+        in_last_week = and_(StudySession.session_date >= week_start, StudySession.session_date <= week_end)
+        
+        # One pass grouped by subject, start hour and weekend yields every session aggregate
+        session_hour = func.extract('hour', StudySession.start_time)
+        weekend_key = self.weekend_key()
+        columns = [
+            StudySession.subject,
+            session_hour,
+            func.count(StudySession.id),
+            func.coalesce(func.sum(StudySession.duration_minutes), 0),
+            func.coalesce(func.max(StudySession.duration_minutes), 0),
+            func.sum(case((in_last_week, 1), else_=0))
+        ]
+        group_by = [StudySession.subject, session_hour]
+        if weekend_key is not None:
+            columns.append(weekend_key)
+            group_by.append(weekend_key)
+        
+        weekends = set()
+        for row in db.session.query(*columns).filter(*completed).group_by(*group_by):
+            subject, hour, session_count, minutes, longest, recent_count = row[:6]
+            subject = sys.intern(subject)
+            snapshot.total_sessions += session_count
+            snapshot.total_minutes += minutes
+            snapshot.longest_minutes = max(snapshot.longest_minutes, longest)
+            snapshot.subject_minutes[subject] = snapshot.subject_minutes.get(subject, 0) + minutes
+            if recent_count:
+                snapshot.recent_subjects.add(subject)
+            if hour is not None:
+                snapshot.hour_counts[hour] = snapshot.hour_counts.get(hour, 0) + session_count
+            if weekend_key is not None and row[6] is not None:
+                weekends.add(row[6])
+        
+        if weekend_key is not None:
+            snapshot.weekend_count = len(weekends)
+        else:
+            snapshot.weekend_count = self.count_study_weekends(user_id)
+        
+        current_streak = get_current_streak(user_id)
+        snapshot.current_streak = current_streak.current_days if current_streak else 0
+        
+        cache[user_id] = snapshot
+        return snapshot
+    
+    def get_hour_histogram(self, user_id: int) -> Dict[int, int]:
+        """
+        Count completed sessions per start hour with one GROUP BY
+        
+        Args:
+            user_id: User to build the histogram for
+            
+        Returns:
+            Dictionary mapping start hour (0-23) to session count
+        """
+        session_hour = func.extract('hour', StudySession.start_time)
+        return dict(db.session.query(
+            session_hour,
+            func.count(StudySession.id)
+        ).filter(
+            StudySession.user_id == user_id,
+            StudySession.completed == True,
+            StudySession.start_time.isnot(None)
+        ).group_by(session_hour).all())
+    
+    def count_study_weekends(self, user_id: int) -> int:
+        """
+        Count distinct weekends with a completed session, grouped in the database
+        
+        Args:
+            user_id: User to count weekends for
+            
+        Returns:
+            Number of weekends (a Saturday and the following Sunday) the user studied on
+        """
+        filters = [StudySession.user_id == user_id, StudySession.completed == True]
+        weekend_key = self.weekend_key()
+        
+        if weekend_key is None:
+            weekend_starts = set()
+            for (study_date,) in db.session.query(StudySession.session_date).filter(*filters).distinct():
+                # Check if session was on weekend (Saturday=5, Sunday=6)
+                if study_date and study_date.weekday() in [5, 6]:
+                    # Get the Saturday of this weekend
+                    days_since_saturday = (study_date.weekday() + 2) % 7
+                    weekend_starts.add(study_date - timedelta(days=days_since_saturday))
+            return len(weekend_starts)
+        
+        # COUNT(DISTINCT) skips the NULL keys of weekday sessions
+        return db.session.query(func.count(func.distinct(weekend_key))).filter(*filters).scalar() or 0
+    
+    def weekend_key(self):
+        """
+        SQL expression equal for a Saturday and the following Sunday and NULL on weekdays
+        
+        Returns:
+            The expression for SQLite and PostgreSQL, None for other dialects
+        """
+        dialect_name = db.session.get_bind().dialect.name
+        
+        if dialect_name == 'sqlite':
+            # julianday + 2.5 is a multiple of 7 on Saturdays, so Saturday and Sunday share a week key
+            is_weekend = func.strftime('%w', StudySession.session_date).in_(['0', '6'])
+            week = cast((func.julianday(StudySession.session_date) + 2.5) / 7, Integer)
+        elif dialect_name == 'postgresql':
+            # Shifting by two days moves Saturday and Sunday into the same ISO (Monday) week
+            is_weekend = func.extract('dow', StudySession.session_date).in_([0, 6])
+            week = func.date_trunc('week', StudySession.session_date + text("INTERVAL '2 days'"))
+        else:
+            return None
+        
+        return case((is_weekend, week))
+    
+    def check_and_award_badges(self, user_id: int, trigger_event: str = 'session_complete',
+                               commit: bool = True) -> List[Badge]:
         """
         Check for newly earned badges and award them
         
         Args:
             user_id: User to check badges for
             trigger_event: What triggered the badge check (session_complete, streak_update, etc.)
+            commit: Commit the awards, or only flush them so the caller can
+                commit them together with other writes
             
         Returns:
             List of newly earned badges
         """
-        user = User.query.get(user_id)
+        user = db.session.get(User, user_id)
         if not user:
             return []
         
-        # Get badges user hasn't earned yet
-        earned_badge_ids = [ub.badge_id for ub in user.user_badges]
-        available_badges = Badge.query.filter(
-            ~Badge.id.in_(earned_badge_ids),
-            Badge.is_active == True
-        ).all()
+        # Checks run after the user's sessions change, so their cached progress is stale
+        invalidate_badge_progress(user_id)
         
-        newly_earned = []
+        # Compare the user's stats against the unearned badges of the cached catalog.
+        # Meta-achievements are left out here and checked below
+        earned_ids = self.get_earned_badge_ids(user_id)
+        snapshot = self.load_user_stats(user_id)
         
-        for badge in available_badges:
-            if self.is_badge_earned(user_id, badge):
-                # Award the badge
-                user_badge = UserBadge(user_id=user_id, badge_id=badge.id)
-                db.session.add(user_badge)
-                newly_earned.append(badge)
+        newly_earned = [
+            badge for checker_func, badge in self.compile_predicates()
+            if badge.id not in earned_ids and checker_func(snapshot, badge)
+        ]
         
-        # Check for meta-achievements (badges that depend on other badges)
-        meta_badges = self.check_meta_achievements(user_id, newly_earned)
-        newly_earned.extend(meta_badges)
+        # Meta-achievements (badges that depend on other badges) are checked on every sweep,
+        # so one added to the catalog later or missed earlier is still awarded; the check
+        # only reads the cached catalog
+        newly_earned.extend(self.check_meta_achievements(
+            user_id, newly_earned, earned_ids | {badge.id for badge in newly_earned}))
+        
+        # Award in one INSERT; nothing crossed means no INSERT at all
+        self.award_badges(user_id, newly_earned)
+        
+        if not commit:
+            db.session.flush()
+            return newly_earned
         
         try:
             db.session.commit()
@@ -69,12 +284,28 @@ class BadgeEngine:
             print(f"Error awarding badges: {e}")
             return []
     
-    def is_badge_earned(self, user_id: int, badge: Badge) -> bool:
+    def get_earned_badge_ids(self, user_id: int) -> Set[int]:
+        """Ids of the badges the user has already earned"""
+        return set(badge_id for (badge_id,) in db.session.query(UserBadge.badge_id).filter_by(user_id=user_id))
+    
+    def is_meta_badge(self, badge: Badge) -> bool:
+        """Whether the badge is earned by collecting other badges"""
+        return (badge.criteria_type == 'special' and
+                badge.criteria.condition == 'earn_all_badges')
+    
+    def award_badges(self, user_id: int, badges: List[Badge]) -> None:
+        """Insert UserBadge rows for the given badges with a single bulk INSERT"""
+        if badges:
+            db.session.bulk_insert_mappings(UserBadge, [
+                {'user_id': user_id, 'badge_id': badge.id} for badge in badges
+            ])
+    
+    def is_badge_earned(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """
         Check if a specific badge has been earned
         
         Args:
-            user_id: User to check
+            snapshot: Stats of the user to check
             badge: Badge to check for
             
         Returns:
@@ -85,186 +316,113 @@ class BadgeEngine:
             print(f"Unknown badge criteria type: {badge.criteria_type}")
             return False
         
-        return checker_func(user_id, badge)
+        return checker_func(snapshot, badge)
     
-    def check_session_badges(self, user_id: int, badge: Badge) -> bool:
+    def check_session_badges(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """Check badges based on session count"""
-        session_count = StudySession.query.filter_by(
-            user_id=user_id,
-            completed=True
-        ).count()
-        
-        return session_count >= badge.criteria_value
+        return snapshot.total_sessions >= badge.criteria_value
     
-    def check_streak_badges(self, user_id: int, badge: Badge) -> bool:
+    def check_streak_badges(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """Check badges based on study streaks"""
-        current_streak = get_current_streak(user_id)
-        if not current_streak:
-            return False
-        
-        return current_streak.current_days >= badge.criteria_value
+        return snapshot.current_streak >= badge.criteria_value
     
-    def check_time_badges(self, user_id: int, badge: Badge) -> bool:
+    def check_time_badges(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """Check badges based on total study time"""
-        total_time = get_total_study_time(user_id)
-        return total_time >= badge.criteria_value
+        return snapshot.total_minutes >= badge.criteria_value
     
-    def check_subject_time_badges(self, user_id: int, badge: Badge) -> bool:
+    def check_subject_time_badges(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """Check badges based on time spent on specific subjects"""
-        criteria_details = badge.get_criteria_details()
-        subject = criteria_details.get('subject')
+        subject = badge.criteria.subject
         
         if not subject:
             return False
         
-        # Calculate total time for this subject
-        sessions = StudySession.query.filter_by(
-            user_id=user_id,
-            subject=subject,
-            completed=True
-        ).all()
-        
-        subject_time = sum(session.duration_minutes for session in sessions if session.duration_minutes)
-        return subject_time >= badge.criteria_value
+        return snapshot.subject_minutes.get(subject, 0) >= badge.criteria_value
     
-    def check_special_badges(self, user_id: int, badge: Badge) -> bool:
+    def check_special_badges(self, snapshot: UserStatsSnapshot, badge: Badge) -> bool:
         """Check special achievement badges with complex criteria"""
-        criteria_details = badge.get_criteria_details()
-        condition = criteria_details.get('condition')
+        criteria = badge.criteria
+        condition = criteria.condition
         
         if condition == 'study_after_hour':
-            return self.check_time_of_day_sessions(user_id, criteria_details.get('hour'), 'after', badge.criteria_value)
+            return snapshot.sessions_by_hour(criteria.hour, 'after') >= badge.criteria_value
         
         elif condition == 'study_before_hour':
-            return self.check_time_of_day_sessions(user_id, criteria_details.get('hour'), 'before', badge.criteria_value)
+            return snapshot.sessions_by_hour(criteria.hour, 'before') >= badge.criteria_value
         
         elif condition == 'weekend_sessions':
-            return self.check_weekend_sessions(user_id, badge.criteria_value)
+            return snapshot.weekend_count >= badge.criteria_value
         
         elif condition == 'single_session_duration':
-            return self.check_long_session(user_id, badge.criteria_value)
+            return snapshot.longest_minutes >= badge.criteria_value
         
         elif condition == 'subjects_in_week':
-            subjects = criteria_details.get('subjects', [])
-            return self.check_subjects_in_timeframe(user_id, subjects, 7)
+            return criteria.subjects.issubset(snapshot.recent_subjects)
         
         elif condition == 'earn_all_badges':
-            rarities = criteria_details.get('rarities', [])
-            return self.check_earned_all_badges_by_rarity(user_id, rarities)
+            return self.check_earned_all_badges_by_rarity(snapshot.user_id, criteria.rarities)
         
         return False
     
-    def check_time_of_day_sessions(self, user_id: int, hour: int, comparison: str, required_count: int) -> bool:
-        """Check if user has studied at specific times"""
-        sessions = StudySession.query.filter_by(
-            user_id=user_id,
-            completed=True
-        ).filter(StudySession.start_time.isnot(None)).all()
-        
-        count = 0
-        for session in sessions:
-            session_hour = session.start_time.hour
-            
-            if comparison == 'after' and session_hour >= hour:
-                count += 1
-            elif comparison == 'before' and session_hour <= hour:
-                count += 1
-        
-        return count >= required_count
-    
-    def check_weekend_sessions(self, user_id: int, required_weekends: int) -> bool:
-        """Check if user has studied on multiple weekends"""
-        sessions = StudySession.query.filter_by(
-            user_id=user_id,
-            completed=True
-        ).all()
-        
-        weekend_dates = set()
-        for session in sessions:
-            # Check if session was on weekend (Saturday=5, Sunday=6)
-            if session.session_date.weekday() in [5, 6]:
-                # Get the Saturday of this weekend
-                days_since_saturday = (session.session_date.weekday() + 2) % 7
-                weekend_start = session.session_date - timedelta(days=days_since_saturday)
-                weekend_dates.add(weekend_start)
-        
-        return len(weekend_dates) >= required_weekends
-    
-    def check_long_session(self, user_id: int, required_duration: int) -> bool:
-        """Check if user has completed a session of required duration"""
-        longest_session = StudySession.query.filter_by(
-            user_id=user_id,
-            completed=True
-        ).filter(StudySession.duration_minutes >= required_duration).first()
-        
-        return longest_session is not None
-    
-    def check_subjects_in_timeframe(self, user_id: int, subjects: List[str], days: int) -> bool:
-        """Check if user studied all subjects within timeframe"""
-        end_date = date.today()
-        start_date = end_date - timedelta(days=days-1)
-        
-        # Get sessions in the timeframe
-        sessions = StudySession.query.filter(
-            StudySession.user_id == user_id,
-            StudySession.completed == True,
-            StudySession.session_date >= start_date,
-            StudySession.session_date <= end_date
-        ).all()
-        
-        studied_subjects = set(session.subject for session in sessions)
-        required_subjects = set(subjects)
-        
-        return required_subjects.issubset(studied_subjects)
-    
     def check_earned_all_badges_by_rarity(self, user_id: int, rarities: List[str]) -> bool:
         """Check if user has earned all badges of specified rarities"""
-        # Get all badges of specified rarities
-        target_badges = Badge.query.filter(
-            Badge.rarity.in_(rarities),
-            Badge.is_active == True,
-            Badge.is_secret == False  # Don't count secret badges
-        ).all()
-        
-        # Get badges user has earned
-        earned_badges = db.session.query(Badge).join(UserBadge).filter(
-            UserBadge.user_id == user_id,
-            Badge.rarity.in_(rarities)
-        ).all()
-        
-        return len(earned_badges) >= len(target_badges)
+        # Count the (non-secret) target badges and the user's earned ones in one pass
+        counted = and_(Badge.is_active == True, Badge.is_secret == False)
+        target_count, earned_count = db.session.query(
+            func.count(func.distinct(case((counted, Badge.id)))),
+            func.count(func.distinct(UserBadge.badge_id))
+        ).select_from(Badge).outerjoin(UserBadge, and_(
+            UserBadge.badge_id == Badge.id,
+            UserBadge.user_id == user_id
+        )).filter(Badge.rarity.in_(rarities)).one()
+        
+        return earned_count >= target_count
     
-    def check_meta_achievements(self, user_id: int, newly_earned: List[Badge]) -> List[Badge]:
-        """Check for meta-achievements that might be unlocked by earning other badges"""
-        meta_badges = []
+    def check_meta_achievements(self, user_id: int, newly_earned: List[Badge],
+                                earned_ids: Set[int] = None) -> List[Badge]:
+        """
+        Check for meta-achievements that might be unlocked by earning other badges
         
-        # Check if user just earned enough badges to unlock meta achievements
-        earned_badge_ids = [ub.badge_id for ub in UserBadge.query.filter_by(user_id=user_id).all()]
-        available_meta_badges = Badge.query.filter(
-            ~Badge.id.in_(earned_badge_ids),
-            Badge.criteria_type == 'special',
-            Badge.is_active == True
-        ).all()
-        
-        for badge in available_meta_badges:
-            criteria_details = badge.get_criteria_details()
-            condition = criteria_details.get('condition')
+        Args:
+            user_id: User to check meta-achievements for
+            newly_earned: Badges awarded in this check
+            earned_ids: Ids of every badge the user holds, including newly_earned;
+                looked up when not supplied
             
-            if condition == 'earn_all_badges':
-                if self.check_earned_all_badges_by_rarity(user_id, criteria_details.get('rarities', [])):
-                    user_badge = UserBadge(user_id=user_id, badge_id=badge.id)
-                    db.session.add(user_badge)
-                    meta_badges.append(badge)
+        Returns:
+            List of meta badges the user now qualifies for
+        """
+        if earned_ids is None:
+            earned_ids = self.get_earned_badge_ids(user_id)
+        catalog = get_all_badges()
+        
+        meta_badges = []
+        for badge in catalog:
+            if not badge.is_active or badge.id in earned_ids or not self.is_meta_badge(badge):
+                continue
+            
+            # Same counts as check_earned_all_badges_by_rarity, taken from the catalog
+            rarities = badge.criteria.rarities
+            target_count = sum(1 for other in catalog
+                               if other.rarity in rarities and other.is_active and not other.is_secret)
+            earned_count = sum(1 for other in catalog
+                               if other.rarity in rarities and other.id in earned_ids)
+            if earned_count >= target_count:
+                meta_badges.append(badge)
         
         return meta_badges
     
-    def get_badge_progress(self, user_id: int, badge: Badge) -> Dict:
+    def get_badge_progress(self, user_id: int, badge: Badge,
+                           snapshot: UserStatsSnapshot = None,
+                           earned_ids: Set[int] = None) -> Dict:
         """
         Get progress toward earning a specific badge
         
         Args:
             user_id: User to check progress for
             badge: Badge to check progress toward
+            snapshot: Preloaded stats to read progress from instead of querying
+            earned_ids: Preloaded ids of the user's earned badges
             
         Returns:
             Dictionary with progress information
@@ -280,15 +438,27 @@ class BadgeEngine:
         }
         
         # Check if already earned
-        user_badge = UserBadge.query.filter_by(user_id=user_id, badge_id=badge.id).first()
-        if user_badge:
+        if earned_ids is not None:
+            already_earned = badge.id in earned_ids
+        else:
+            already_earned = db.session.query(exists().where(and_(
+                UserBadge.user_id == user_id,
+                UserBadge.badge_id == badge.id
+            ))).scalar()
+        if already_earned:
             progress['is_earned'] = True
             progress['progress_percent'] = 100
             return progress
         
         # Calculate current progress based on badge type
-        if badge.criteria_type == 'sessions':
-            progress['current'] = StudySession.query.filter_by(user_id=user_id, completed=True).count()
+        if snapshot is not None:
+            progress['current'] = self.get_snapshot_progress(snapshot, badge)
+        
+        elif badge.criteria_type == 'sessions':
+            progress['current'] = db.session.query(func.count(StudySession.id)).filter_by(
+                user_id=user_id,
+                completed=True
+            ).scalar()
         
         elif badge.criteria_type == 'streak':
             current_streak = get_current_streak(user_id)
@@ -298,8 +468,7 @@ class BadgeEngine:
             progress['current'] = get_total_study_time(user_id)
         
         elif badge.criteria_type == 'subject_time':
-            criteria_details = badge.get_criteria_details()
-            subject = criteria_details.get('subject')
+            subject = badge.criteria.subject
             if subject:
                 sessions = StudySession.query.filter_by(
                     user_id=user_id,
@@ -318,46 +487,65 @@ class BadgeEngine:
         
         return progress
     
+    def get_snapshot_progress(self, snapshot: UserStatsSnapshot, badge: Badge) -> int:
+        """
+        Read progress toward a badge from a preloaded stats snapshot
+        
+        Args:
+            snapshot: Aggregated stats for the user
+            badge: Badge to check progress toward
+            
+        Returns:
+            Current progress value in the badge's criteria units
+        """
+        if badge.criteria_type == 'sessions':
+            return snapshot.total_sessions
+        
+        elif badge.criteria_type == 'streak':
+            return snapshot.current_streak
+        
+        elif badge.criteria_type == 'time':
+            return snapshot.total_minutes
+        
+        elif badge.criteria_type == 'subject_time':
+            subject = badge.criteria.subject
+            return snapshot.subject_minutes.get(subject, 0) if subject else 0
+        
+        elif badge.criteria_type == 'special':
+            criteria = badge.criteria
+            condition = criteria.condition
+            
+            if condition in ['study_after_hour', 'study_before_hour']:
+                comparison = 'after' if condition == 'study_after_hour' else 'before'
+                return snapshot.sessions_by_hour(criteria.hour, comparison)
+            
+            elif condition == 'weekend_sessions':
+                return snapshot.weekend_count
+            
+            elif condition == 'single_session_duration':
+                return snapshot.longest_minutes
+        
+        return 0
+    
     def get_special_badge_progress(self, user_id: int, badge: Badge) -> int:
         """Get progress for special badges with complex criteria"""
-        criteria_details = badge.get_criteria_details()
-        condition = criteria_details.get('condition')
+        criteria = badge.criteria
+        condition = criteria.condition
         
         if condition in ['study_after_hour', 'study_before_hour']:
-            hour = criteria_details.get('hour')
+            hour = criteria.hour
             comparison = 'after' if condition == 'study_after_hour' else 'before'
             
-            sessions = StudySession.query.filter_by(
-                user_id=user_id,
-                completed=True
-            ).filter(StudySession.start_time.isnot(None)).all()
-            
-            count = 0
-            for session in sessions:
-                session_hour = session.start_time.hour
-                if comparison == 'after' and session_hour >= hour:
-                    count += 1
-                elif comparison == 'before' and session_hour <= hour:
-                    count += 1
-            
-            return count
+            return count_sessions_by_hour(self.get_hour_histogram(user_id), hour, comparison)
         
         elif condition == 'weekend_sessions':
-            sessions = StudySession.query.filter_by(user_id=user_id, completed=True).all()
-            weekend_dates = set()
-            for session in sessions:
-                if session.session_date.weekday() in [5, 6]:
-                    days_since_saturday = (session.session_date.weekday() + 2) % 7
-                    weekend_start = session.session_date - timedelta(days=days_since_saturday)
-                    weekend_dates.add(weekend_start)
-            return len(weekend_dates)
+            return self.count_study_weekends(user_id)
         
         elif condition == 'single_session_duration':
-            longest = StudySession.query.filter_by(
+            return db.session.query(func.max(StudySession.duration_minutes)).filter_by(
                 user_id=user_id,
                 completed=True
-            ).order_by(StudySession.duration_minutes.desc()).first()
-            return longest.duration_minutes if longest else 0
+            ).scalar() or 0
         
         return 0
 
@@ -366,25 +554,64 @@ class BadgeEngine:
 badge_engine = BadgeEngine()
 
 
-def check_and_award_badges(user_id: int, trigger_event: str = 'session_complete') -> List[Badge]:
+def check_and_award_badges(user_id: int, trigger_event: str = 'session_complete',
+                           commit: bool = True) -> List[Badge]:
     """Convenience function for checking and awarding badges"""
-    return badge_engine.check_and_award_badges(user_id, trigger_event)
+    return badge_engine.check_and_award_badges(user_id, trigger_event, commit)
+
+
+# Progress lists per user as (expires_at, local_date, progress). Streak-based progress moves at
+# midnight, so an entry only serves the day it was built on; entries sit in write order
+PROGRESS_CACHE_TTL = 3600
+PROGRESS_CACHE_MAXSIZE = 256
+_PROGRESS_CACHE = {}
+# Requests on the threaded server read, store and invalidate entries concurrently
+_PROGRESS_CACHE_LOCK = threading.Lock()
+
+
+def invalidate_badge_progress(user_id: int = None) -> None:
+    """Drop the cached progress list for a user, or for everyone when no user is given"""
+    with _PROGRESS_CACHE_LOCK:
+        if user_id is None:
+            _PROGRESS_CACHE.clear()
+        else:
+            _PROGRESS_CACHE.pop(user_id, None)
+
+
+def _store_badge_progress(user_id: int, now: float, today: date, progress_list: List[Dict]) -> None:
+    """Cache a progress list, first evicting expired entries and then the oldest beyond the size limit"""
+    with _PROGRESS_CACHE_LOCK:
+        _PROGRESS_CACHE.pop(user_id, None)
+        for oldest_id, (expires_at, built_on, _) in list(_PROGRESS_CACHE.items()):
+            if expires_at > now and built_on == today and len(_PROGRESS_CACHE) < PROGRESS_CACHE_MAXSIZE:
+                break
+            _PROGRESS_CACHE.pop(oldest_id, None)
+        _PROGRESS_CACHE[user_id] = (now + PROGRESS_CACHE_TTL, today, progress_list)
 
 
 def get_badge_progress_for_user(user_id: int) -> List[Dict]:
-    """Get progress toward all available badges for a user"""
-    earned_badge_ids = [ub.badge_id for ub in UserBadge.query.filter_by(user_id=user_id).all()]
+    """Get progress toward all available badges for a user (cached for up to an hour, within one day)"""
+    now = time.monotonic()
+    today = streak_calculator.get_local_date()
+    with _PROGRESS_CACHE_LOCK:
+        cached = _PROGRESS_CACHE.get(user_id)
+    if cached and cached[0] > now and cached[1] == today:
+        return cached[2]
     
     # Get unearned badges (excluding secret ones)
     available_badges = Badge.query.filter(
-        ~Badge.id.in_(earned_badge_ids),
+        not_earned_by(user_id),
         Badge.is_active == True,
         Badge.is_secret == False
     ).order_by(Badge.tier, Badge.rarity).all()
     
-    progress_list = []
-    for badge in available_badges:
-        progress = badge_engine.get_badge_progress(user_id, badge)
-        progress_list.append(progress)
+    # Load the user's aggregates once and read every badge's progress from them
+    snapshot = badge_engine.load_user_stats(user_id)
+    earned_ids = badge_engine.get_earned_badge_ids(user_id)
     
+    progress_list = [
+        badge_engine.get_badge_progress(user_id, badge, snapshot, earned_ids)
+        for badge in available_badges
+    ]
+    _store_badge_progress(user_id, now, today, progress_list)
     return progress_list
\ No newline at end of file
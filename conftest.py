@@ -0,0 +1,81 @@
+"""
+Shared pytest fixtures for the Study Streak Motivator tests
+The suite runs against an in-memory SQLite database set up once per run;
+each test using db_session runs in a transaction that is rolled back
+"""
+
+import os
+
+# Must be set before app is imported, since the engine is configured at import
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import pytest
+from sqlite3 import Connection as SQLite3Connection
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from app import app
+from models import db, ensure_indexes, create_default_badges, User
+
+def set_test_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Test data is throwaway, so when DATABASE_URL points at a file skip the fsync on
+    every commit and keep the journal in memory. Registered after app.py's WAL
+    listener on the same engine, so these settings win
+    """
+    if not isinstance(dbapi_connection, SQLite3Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+with app.app_context():
+    event.listen(db.engine, "connect", set_test_sqlite_pragmas)
+
+class _ConnectionBoundSession(Session):
+    """Session that always uses the connection it was created with, never the engine"""
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return self.bind
+
+@pytest.fixture(scope="session", autouse=True)
+def _app():
+    """The Flask app with its database initialized once for the whole run, like init_db.py"""
+    with app.app_context():
+        db.create_all()
+        # create_all() skips existing tables, so make sure the streak indexes are there too
+        ensure_indexes()
+        create_default_badges()
+        if not User.query.filter_by(username='student').first():
+            db.session.add(User(username='student', email='student@example.com'))
+            db.session.commit()
+    return app
+
+@pytest.fixture
+def db_session(_app):
+    """
+    Run the test inside an outer transaction that is rolled back afterwards.
+    Commits inside the test only release SAVEPOINTs, so nothing reaches the database.
+    """
+    with _app.app_context():
+        connection = db.engine.connect()
+        # pysqlite manages transactions itself and breaks SAVEPOINTs; emit BEGIN by hand
+        driver_connection = connection.connection.driver_connection
+        isolation_level = driver_connection.isolation_level
+        driver_connection.isolation_level = None
+        outer_transaction = connection.begin()
+        connection.exec_driver_sql('BEGIN')
+        app_session = db.session
+        db.session = scoped_session(sessionmaker(
+            class_=_ConnectionBoundSession, db=db, bind=connection,
+            query_cls=db.Query, join_transaction_mode='create_savepoint'))
+        try:
+            yield db.session
+        finally:
+            db.session.remove()
+            db.session = app_session
+            outer_transaction.rollback()
+            driver_connection.isolation_level = isolation_level
+            connection.close()
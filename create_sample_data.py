@@ -8,6 +8,8 @@ from db_utils import *
 from datetime import date, timedelta
 import random
 
+SAMPLE_SEED = 42  # Fixed seed so repeated runs create identical sample data
+
 def create_sample_data():
     """Create realistic sample data for testing"""
     print("🎭 Creating sample data for Study Streak Motivator...")
@@ -20,40 +22,30 @@ def create_sample_data():
         
         print(f"👤 Using user: {user.username} (ID: {user.id})")
         
-        # Create study sessions over the past week
+        # Create study sessions over the past week (seeded so every run builds the same data)
+        rng = random.Random(SAMPLE_SEED)
         subjects = ['Math', 'Science', 'English', 'History', 'Other']
         durations = [15, 20, 25, 30, 45]  # Common study session lengths
         
-        # Create sessions for the past 7 days to build up a streak
-        sessions_created = 0
+        # 1-3 sessions a day for the past 7 days to build up a streak, plus 2 for today
+        schedule = []
         for days_ago in range(7, 0, -1):  # 7 days ago to yesterday
-            session_date = date.today() - timedelta(days=days_ago)
-            
-            # Create 1-3 sessions per day
-            daily_sessions = random.randint(1, 3)
-            for _ in range(daily_sessions):
-                subject = random.choice(subjects)
-                duration = random.choice(durations)
-                
-                session = create_study_session(
-                    user.id, 
-                    subject, 
-                    duration, 
-                    session_date
-                )
-                # Mark as completed
-                session.mark_completed()
-                sessions_created += 1
+            schedule.extend([date.today() - timedelta(days=days_ago)] * rng.randint(1, 3))
+        schedule.extend([date.today()] * 2)
         
-        # Create sessions for today
-        today_sessions = 2
-        for _ in range(today_sessions):
-            subject = random.choice(subjects)
-            duration = random.choice(durations)
-            
-            session = create_study_session(user.id, subject, duration)
-            session.mark_completed()
-            sessions_created += 1
+        # Insert every session already completed in one bulk INSERT
+        db.session.bulk_insert_mappings(StudySession, [
+            {
+                'user_id': user.id,
+                'subject': rng.choice(subjects),
+                'duration_minutes': rng.choice(durations),
+                'session_date': session_date,
+                'completed': True
+            }
+            for session_date in schedule
+        ])
+        db.session.commit()
+        sessions_created = len(schedule)
         
         print(f"📚 Created {sessions_created} study sessions over 8 days")
         
@@ -61,7 +53,7 @@ def create_sample_data():
         print("🔥 Updating streak data...")
         current_streak = update_streak(user.id)
         if current_streak:
-            print(f"   Current streak: {current_streak.current_days} days")
+            print(f"   Current streak: {current_streak['current_streak']} days")
         
         # Check for badges
         print("🏆 Checking for badge awards...")
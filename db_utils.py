@@ -3,9 +3,10 @@ Database utility functions for Study Streak Motivator
 Common CRUD operations and helper functions
 """
 
+from collections import namedtuple
 from datetime import date, datetime, timedelta
 from models import db, User, StudySession, Streak, Badge, UserBadge
-from sqlalchemy import func
+from sqlalchemy import func, case, and_, exists, lambda_stmt, select
 
 # User Functions
 def create_user(username, email=None):
@@ -21,11 +22,11 @@ def get_user_by_username(username):
 
 def get_user_by_id(user_id):
     """Get user by ID"""
-    return User.query.get(user_id)
+    return db.session.get(User, user_id)
 
 # Study Session Functions
-def create_study_session(user_id, subject, duration_minutes, session_date=None):
-    """Create a new study session"""
+def create_study_session(user_id, subject, duration_minutes, session_date=None, commit=True):
+    """Create a new study session (commit=False only flushes it into the caller's transaction)"""
     if session_date is None:
         session_date = date.today()
     
@@ -37,15 +38,57 @@ def create_study_session(user_id, subject, duration_minutes, session_date=None):
         start_time=datetime.utcnow()
     )
     db.session.add(session)
-    db.session.commit()
+    if commit:
+        db.session.commit()
+    else:
+        db.session.flush()
     return session
 
 def get_user_sessions(user_id, limit=None):
     """Get all study sessions for a user"""
-    query = StudySession.query.filter_by(user_id=user_id).order_by(StudySession.start_time.desc())
+    stmt = lambda_stmt(lambda: select(StudySession).where(
+        StudySession.user_id == user_id
+    ).order_by(StudySession.start_time.desc()))
+    if limit:
+        stmt += lambda s: s.limit(limit)
+    return db.session.execute(stmt).scalars().all()
+
+# Columns the session lists render; selecting just these skips building StudySession objects
+SESSION_DISPLAY_COLUMNS = (
+    StudySession.id,
+    StudySession.subject,
+    StudySession.duration_minutes,
+    StudySession.session_date,
+    StudySession.start_time,
+    StudySession.completed,
+    StudySession.notes
+)
+
+def get_user_session_rows(user_id, limit=None):
+    """Get a user's sessions, newest first, as read-only rows of SESSION_DISPLAY_COLUMNS"""
+    stmt = lambda_stmt(lambda: select(*SESSION_DISPLAY_COLUMNS).where(
+        StudySession.user_id == user_id
+    ).order_by(StudySession.start_time.desc()))
     if limit:
-        query = query.limit(limit)
-    return query.all()
+        stmt += lambda s: s.limit(limit)
+    return db.session.execute(stmt).all()
+
+def get_month_session_marker(user_id, year, month, min_minutes):
+    """Get a user's qualifying minutes per day for a month - the same totals the calendar shows"""
+    first_day = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    
+    # Same filter as the calendar, so completing, editing or replacing a session changes it
+    return tuple(db.session.query(
+        StudySession.session_date,
+        func.sum(StudySession.duration_minutes)
+    ).filter(
+        StudySession.user_id == user_id,
+        StudySession.completed == True,
+        StudySession.session_date >= first_day,
+        StudySession.session_date < next_month,
+        StudySession.duration_minutes >= min_minutes
+    ).group_by(StudySession.session_date).order_by(StudySession.session_date).all())
 
 def get_sessions_by_date(user_id, session_date):
     """Get study sessions for a specific date"""
@@ -56,14 +99,60 @@ def get_sessions_by_date(user_id, session_date):
 
 def get_total_study_time(user_id, days=None):
     """Get total study time for a user (optionally within last N days)"""
-    query = StudySession.query.filter_by(user_id=user_id, completed=True)
+    stmt = lambda_stmt(lambda: select(
+        func.coalesce(func.sum(StudySession.duration_minutes), 0)
+    ).where(StudySession.user_id == user_id, StudySession.completed == True))
     
     if days:
         since_date = date.today() - timedelta(days=days)
-        query = query.filter(StudySession.session_date >= since_date)
+        stmt += lambda s: s.where(StudySession.session_date >= since_date)
+    
+    return db.session.execute(stmt).scalar()
+
+SessionTotals = namedtuple('SessionTotals', [
+    'total_minutes', 'weekly_minutes', 'total_sessions', 'today_minutes', 'last_week_minutes'
+])
+
+def get_session_totals(user_id, days=7):
+    """Get completed-session totals in one query: all-time and last-N-days minutes, session count,
+    minutes since yesterday and minutes in the N days before the last N"""
+    today = date.today()
+    since_date = today - timedelta(days=days)
+    yesterday = today - timedelta(days=1)
+    previous_start = today - timedelta(days=2 * days - 1)
+    minutes = StudySession.duration_minutes
+    
+    # A cached lambda statement: only the dates and user id change between calls
+    row = db.session.execute(lambda_stmt(lambda: select(
+        func.coalesce(func.sum(minutes), 0),
+        func.coalesce(func.sum(case((StudySession.session_date >= since_date, minutes), else_=0)), 0),
+        func.count(StudySession.id),
+        func.coalesce(func.sum(case((StudySession.session_date >= yesterday, minutes), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(
+            StudySession.session_date >= previous_start,
+            StudySession.session_date <= since_date
+        ), minutes), else_=0)), 0)
+    ).where(
+        StudySession.user_id == user_id,
+        StudySession.completed == True
+    ))).one()
     
-    sessions = query.all()
-    return sum(session.duration_minutes for session in sessions)
+    return SessionTotals(*row)
+
+def get_recent_minutes_by_day_and_hour(user_id, days=30):
+    """Get (session_date, start hour, minutes) totals for the last N days in one grouped query"""
+    start_date = date.today() - timedelta(days=days-1)
+    session_hour = func.extract('hour', StudySession.start_time)
+    
+    return db.session.query(
+        StudySession.session_date,
+        session_hour,
+        func.sum(StudySession.duration_minutes)
+    ).filter(
+        StudySession.user_id == user_id,
+        StudySession.completed == True,
+        StudySession.session_date >= start_date
+    ).group_by(StudySession.session_date, session_hour).all()
 
 def get_study_stats_by_subject(user_id, days=30):
     """Get study time breakdown by subject"""
@@ -91,83 +180,138 @@ def get_study_stats_by_subject(user_id, days=30):
 # Streak Functions
 def get_current_streak(user_id):
     """Get the user's current active streak"""
-    return Streak.query.filter_by(user_id=user_id, is_active=True).first()
+    return db.session.execute(lambda_stmt(lambda: select(Streak).where(
+        Streak.user_id == user_id, Streak.is_active == True
+    ).limit(1))).scalars().first()
 
-def update_streak(user_id):
+def update_streak(user_id, commit=True):
     """Update user's streak based on study activity - Enhanced Phase 4 version"""
     from streak_calculator import streak_calculator
-    return streak_calculator.update_user_streak(user_id)
+    return streak_calculator.update_user_streak(user_id, commit)
 
 # Badge Functions
-def check_and_award_badges(user_id):
+def not_earned_by(user_id):
+    """Filter clause matching badges the user has not earned (a NOT EXISTS anti-join on user_badges)"""
+    return ~exists().where(and_(UserBadge.badge_id == Badge.id, UserBadge.user_id == user_id))
+
+def check_and_award_badges(user_id, commit=True):
     """Check if user has earned any new badges - Enhanced Phase 6 version"""
     try:
         from badge_engine import check_and_award_badges as engine_check_badges
-        return engine_check_badges(user_id)
+        return engine_check_badges(user_id, commit=commit)
     except ImportError:
         # Fallback to basic checking if badge engine not available
-        user = get_user_by_id(user_id)
-        if not user:
+        if not get_user_by_id(user_id):
             return []
         
         # Get all badges user hasn't earned yet
-        earned_badge_ids = [ub.badge_id for ub in user.user_badges]
-        available_badges = Badge.query.filter(~Badge.id.in_(earned_badge_ids)).all()
+        available_badges = get_available_badges(user_id)
         
-        newly_earned = []
+        # Load each criteria value once instead of querying per badge
+        totals = get_session_totals(user_id)
+        current_streak = get_current_streak(user_id)
+        progress = {
+            'sessions': totals.total_sessions,
+            'streak': current_streak.current_days if current_streak else 0,
+            'time': totals.total_minutes
+        }
         
-        for badge in available_badges:
-            earned = False
-            
-            if badge.criteria_type == 'sessions':
-                session_count = StudySession.query.filter_by(user_id=user_id, completed=True).count()
-                earned = session_count >= badge.criteria_value
-            
-            elif badge.criteria_type == 'streak':
-                current_streak = get_current_streak(user_id)
-                if current_streak:
-                    earned = current_streak.current_days >= badge.criteria_value
-            
-            elif badge.criteria_type == 'time':
-                total_minutes = get_total_study_time(user_id)
-                earned = total_minutes >= badge.criteria_value
-            
-            if earned:
-                # Award the badge
-                user_badge = UserBadge(user_id=user_id, badge_id=badge.id)
-                db.session.add(user_badge)
-                newly_earned.append(badge)
+        newly_earned = [
+            badge for badge in available_badges
+            if progress.get(badge.criteria_type) is not None
+            and progress[badge.criteria_type] >= badge.criteria_value
+        ]
         
-        db.session.commit()
+        # Award every new badge with a single bulk INSERT
+        if newly_earned:
+            db.session.bulk_insert_mappings(UserBadge, [
+                {'user_id': user_id, 'badge_id': badge.id} for badge in newly_earned
+            ])
+        
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
         return newly_earned
 
+# Badge catalog, loaded once per process; badges only change when the database is (re)initialised
+_BADGE_CATALOG = {'badges': None, 'by_id': None}
+
+def get_all_badges():
+    """Get every badge ordered for display, as a cached tuple of detached Badge objects"""
+    if _BADGE_CATALOG['badges'] is None:
+        badges = Badge.query.order_by(Badge.category, Badge.tier, Badge.name).all()
+        for badge in badges:
+            db.session.expunge(badge)
+        _BADGE_CATALOG['badges'] = tuple(badges)
+        _BADGE_CATALOG['by_id'] = {badge.id: badge for badge in badges}
+    return _BADGE_CATALOG['badges']
+
+def get_badge_catalog():
+    """Get the cached badges keyed by id"""
+    get_all_badges()
+    return _BADGE_CATALOG['by_id']
+
+def invalidate_badge_catalog():
+    """Forget the cached badge catalog so the next get_all_badges() reloads it"""
+    _BADGE_CATALOG['badges'] = None
+    _BADGE_CATALOG['by_id'] = None
+    try:
+        # Progress lists were computed against the old catalog
+        from badge_engine import invalidate_badge_progress
+        invalidate_badge_progress()
+    except ImportError:
+        pass
+
+def get_earned_badge_ids(user_id):
+    """Get the ids of a user's earned badges, most recently earned first"""
+    return [badge_id for (badge_id,) in db.session.query(UserBadge.badge_id).filter_by(
+        user_id=user_id
+    ).order_by(UserBadge.earned_at.desc())]
+
 def get_user_badges(user_id):
-    """Get all badges earned by a user"""
-    return db.session.query(Badge).join(UserBadge).filter(
-        UserBadge.user_id == user_id
-    ).order_by(UserBadge.earned_at.desc()).all()
+    """Get all badges earned by a user, most recent first, from the cached catalog"""
+    earned_ids = get_earned_badge_ids(user_id)
+    catalog = get_badge_catalog()
+    if any(badge_id not in catalog for badge_id in earned_ids):
+        # Badges were added since the catalog was loaded
+        invalidate_badge_catalog()
+        catalog = get_badge_catalog()
+    return [catalog[badge_id] for badge_id in earned_ids if badge_id in catalog]
+
+def get_badge_stats(user_id):
+    """Get badge collection totals for a user in a single aggregate query"""
+    earned = UserBadge.id.isnot(None)
+    total_badges, earned_count, total_points, rare_count = db.session.query(
+        func.count(Badge.id),
+        func.count(UserBadge.id),
+        func.coalesce(func.sum(case((earned, Badge.points), else_=0)), 0),
+        func.coalesce(func.sum(case((and_(earned, Badge.rarity.in_(['epic', 'legendary'])), 1), else_=0)), 0)
+    ).outerjoin(
+        UserBadge, and_(UserBadge.badge_id == Badge.id, UserBadge.user_id == user_id)
+    ).one()
+    
+    return {
+        'total_badges': total_badges,
+        'earned_count': earned_count,
+        'total_points': total_points,
+        'completion_percentage': round((earned_count / total_badges) * 100) if total_badges else 0,
+        'rare_badges_count': rare_count
+    }
 
 def get_available_badges(user_id):
-    """Get badges the user hasn't earned yet"""
-    earned_badge_ids = [ub.badge_id for ub in UserBadge.query.filter_by(user_id=user_id).all()]
-    return Badge.query.filter(~Badge.id.in_(earned_badge_ids)).all()
+    """Get badges the user hasn't earned yet, from the cached catalog"""
+    earned_ids = set(get_earned_badge_ids(user_id))
+    return [badge for badge in get_all_badges() if badge.id not in earned_ids]
 
 # Enhanced Dashboard Analytics Functions
-def get_study_time_trends(user_id, days=30):
-    """Get daily study time trends for the last N days"""
+def get_study_time_trends(user_id, days=30, rows=None):
+    """Get daily study time trends for the last N days (from get_recent_minutes_by_day_and_hour rows if given)"""
     end_date = date.today()
     start_date = end_date - timedelta(days=days-1)
     
-    # Get sessions grouped by date
-    results = db.session.query(
-        StudySession.session_date,
-        func.sum(StudySession.duration_minutes).label('total_minutes')
-    ).filter(
-        StudySession.user_id == user_id,
-        StudySession.completed == True,
-        StudySession.session_date >= start_date,
-        StudySession.session_date <= end_date
-    ).group_by(StudySession.session_date).all()
+    if rows is None:
+        rows = get_recent_minutes_by_day_and_hour(user_id, days)
     
     # Create data for all days (including zeros)
     trends = {}
@@ -177,31 +321,20 @@ def get_study_time_trends(user_id, days=30):
         current_date += timedelta(days=1)
     
     # Fill in actual data
-    for result in results:
-        trends[result.session_date.isoformat()] = result.total_minutes or 0
+    for session_date, _, minutes in rows:
+        if start_date <= session_date <= end_date:
+            trends[session_date.isoformat()] += minutes or 0
     
     return trends
 
-def get_weekly_comparison(user_id):
-    """Compare this week vs last week study performance"""
-    today = date.today()
-    
-    # This week (last 7 days)
-    this_week_start = today - timedelta(days=6)
-    this_week_total = get_total_study_time(user_id, days=7)
-    
-    # Last week (days 7-13 ago)
-    last_week_start = today - timedelta(days=13)
-    last_week_end = today - timedelta(days=7)
-    
-    last_week_sessions = StudySession.query.filter(
-        StudySession.user_id == user_id,
-        StudySession.completed == True,
-        StudySession.session_date >= last_week_start,
-        StudySession.session_date <= last_week_end
-    ).all()
+def get_weekly_comparison(user_id, totals=None):
+    """Compare this week vs last week study performance (from get_session_totals() if given)"""
+    if totals is None:
+        totals = get_session_totals(user_id)
     
-    last_week_total = sum(session.duration_minutes for session in last_week_sessions)
+    # This week (last 7 days) and last week (days 7-13 ago)
+    this_week_total = totals.weekly_minutes
+    last_week_total = totals.last_week_minutes
     
     # Calculate change
     if last_week_total > 0:
@@ -216,28 +349,33 @@ def get_weekly_comparison(user_id):
         'trend': 'up' if change_percent > 0 else 'down' if change_percent < 0 else 'same'
     }
 
-def get_study_hour_analysis(user_id, days=30):
-    """Analyze what hours of day user studies most"""
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days-1)
-    
-    sessions = StudySession.query.filter(
-        StudySession.user_id == user_id,
-        StudySession.completed == True,
-        StudySession.session_date >= start_date
-    ).all()
+def get_study_hour_analysis(user_id, days=30, rows=None):
+    """Analyze what hours of day user studies most (from get_recent_minutes_by_day_and_hour rows if given)"""
+    if rows is None:
+        # Let the database bucket by start hour: at most 25 rows (NULL start times included)
+        start_date = date.today() - timedelta(days=days-1)
+        session_hour = func.extract('hour', StudySession.start_time)
+        hour_totals = db.session.query(
+            session_hour,
+            func.sum(StudySession.duration_minutes)
+        ).filter(
+            StudySession.user_id == user_id,
+            StudySession.completed == True,
+            StudySession.session_date >= start_date
+        ).group_by(session_hour).all()
+    else:
+        hour_totals = [(hour, minutes) for _, hour, minutes in rows]
     
     hour_data = {}
     for hour in range(24):
         hour_data[hour] = 0
     
-    for session in sessions:
-        if session.start_time:
-            hour = session.start_time.hour
-            hour_data[hour] += session.duration_minutes
+    for hour, minutes in hour_totals:
+        if hour is not None:
+            hour_data[hour] += minutes
     
     # Find peak hours
-    peak_hour = max(hour_data, key=hour_data.get) if sessions else 12
+    peak_hour = max(hour_data, key=hour_data.get) if hour_totals else 12
     peak_minutes = hour_data[peak_hour]
     
     return {
@@ -249,7 +387,12 @@ def get_study_hour_analysis(user_id, days=30):
 
 def get_streak_history(user_id, limit=10):
     """Get historical streak data for visualization"""
-    streaks = Streak.query.filter_by(user_id=user_id).order_by(Streak.created_at.desc()).limit(limit).all()
+    streaks = db.session.execute(
+        select(Streak.current_days, Streak.start_date, Streak.end_date, Streak.is_active, Streak.created_at)
+        .where(Streak.user_id == user_id)
+        .order_by(Streak.created_at.desc())
+        .limit(limit)
+    ).all()
     
     streak_data = []
     for streak in streaks:
@@ -263,20 +406,21 @@ def get_streak_history(user_id, limit=10):
     
     return streak_data
 
-def get_goal_progress(user_id):
+def get_goal_progress(user_id, totals=None):
     """Get progress toward study goals (placeholder for future goal system)"""
-    today = date.today()
+    if totals is None:
+        totals = get_session_totals(user_id)
     
     # Default daily goal (can be customized later)
     daily_goal_minutes = 60  # 1 hour default
     weekly_goal_minutes = 300  # 5 hours default
     
     # Today's progress
-    today_minutes = get_total_study_time(user_id, days=1)
+    today_minutes = totals.today_minutes
     daily_progress = min(100, (today_minutes / daily_goal_minutes) * 100)
     
     # This week's progress
-    weekly_minutes = get_total_study_time(user_id, days=7)
+    weekly_minutes = totals.weekly_minutes
     weekly_progress = min(100, (weekly_minutes / weekly_goal_minutes) * 100)
     
     return {
@@ -304,19 +448,21 @@ def get_dashboard_data(user_id):
     from streak_calculator import get_streak_status
     
     current_streak = get_current_streak(user_id)
-    recent_sessions = get_user_sessions(user_id, limit=10)
+    recent_sessions = get_user_session_rows(user_id, limit=10)
     earned_badges = get_user_badges(user_id)
     subject_stats = get_study_stats_by_subject(user_id)
     
     # Get enhanced streak information
     streak_status = get_streak_status(user_id)
     
-    # Get enhanced analytics data
-    study_trends = get_study_time_trends(user_id, days=14)  # Last 2 weeks
-    weekly_comparison = get_weekly_comparison(user_id)
-    hour_analysis = get_study_hour_analysis(user_id)
+    # Get enhanced analytics data; the totals and the 30-day grid each take one query
+    totals = get_session_totals(user_id)
+    recent_rows = get_recent_minutes_by_day_and_hour(user_id, days=30)
+    study_trends = get_study_time_trends(user_id, days=14, rows=recent_rows)  # Last 2 weeks
+    weekly_comparison = get_weekly_comparison(user_id, totals)
+    hour_analysis = get_study_hour_analysis(user_id, rows=recent_rows)
     streak_history = get_streak_history(user_id, limit=5)
-    goal_progress = get_goal_progress(user_id)
+    goal_progress = get_goal_progress(user_id, totals)
     
     return {
         'user': user,
@@ -326,9 +472,9 @@ def get_dashboard_data(user_id):
         'streak_message': streak_status['message'],
         'has_studied_today': streak_status['has_studied_today'],
         'today_study_minutes': streak_status['today_study_minutes'],
-        'total_study_time': get_total_study_time(user_id),
-        'weekly_study_time': get_total_study_time(user_id, days=7),
-        'total_sessions': StudySession.query.filter_by(user_id=user_id, completed=True).count(),
+        'total_study_time': totals.total_minutes,
+        'weekly_study_time': totals.weekly_minutes,
+        'total_sessions': totals.total_sessions,
         'recent_sessions': recent_sessions,
         'earned_badges': earned_badges,
         'subject_stats': subject_stats,
@@ -342,20 +488,37 @@ def get_dashboard_data(user_id):
 
 # Utility Functions
 def complete_study_session(session_id):
-    """Mark a study session as completed and check for badge awards"""
-    session = StudySession.query.get(session_id)
+    """Mark a study session as completed and check for badge awards, all in one transaction"""
+    session = db.session.get(StudySession, session_id)
     if session:
-        session.mark_completed()
+        session.mark_completed(commit=False)
         
         # Update streak
-        update_streak(session.user_id)
+        update_streak(session.user_id, commit=False)
         
         # Check for new badges
-        new_badges = check_and_award_badges(session.user_id)
+        new_badges = check_and_award_badges(session.user_id, commit=False)
         
+        db.session.commit()
         return session, new_badges
     return None, []
 
+def complete_study_sessions(session_ids):
+    """Mark several study sessions as completed in one transaction, updating each user's
+    streak and checking their badges once for the whole batch instead of once per session"""
+    by_id = {session.id: session for session in StudySession.query.filter(StudySession.id.in_(session_ids))}
+    sessions = [by_id[session_id] for session_id in session_ids if session_id in by_id]
+    for session in sessions:
+        session.mark_completed(commit=False)
+    
+    new_badges = []
+    for user_id in sorted({session.user_id for session in sessions}):
+        update_streak(user_id, commit=False)
+        new_badges.extend(check_and_award_badges(user_id, commit=False))
+    
+    db.session.commit()
+    return sessions, new_badges
+
 def get_study_calendar_data(user_id, year=None, month=None):
     """Get study session data for calendar view"""
     if year is None:
@@ -370,30 +533,30 @@ def get_study_calendar_data(user_id, year=None, month=None):
     else:
         last_day = date(year, month + 1, 1) - timedelta(days=1)
     
-    sessions = StudySession.query.filter(
+    # One row per (day, subject) carries everything the calendar needs
+    rows = db.session.query(
+        StudySession.session_date,
+        StudySession.subject,
+        func.count(StudySession.id),
+        func.sum(StudySession.duration_minutes)
+    ).filter(
         StudySession.user_id == user_id,
         StudySession.session_date >= first_day,
         StudySession.session_date <= last_day,
         StudySession.completed == True
-    ).all()
+    ).group_by(StudySession.session_date, StudySession.subject).order_by(StudySession.subject).all()
     
     # Group by date
     calendar_data = {}
-    for session in sessions:
-        date_str = session.session_date.isoformat()
-        if date_str not in calendar_data:
-            calendar_data[date_str] = {
-                'sessions': 0,
-                'total_minutes': 0,
-                'subjects': set()
-            }
-        calendar_data[date_str]['sessions'] += 1
-        calendar_data[date_str]['total_minutes'] += session.duration_minutes
-        calendar_data[date_str]['subjects'].add(session.subject)
-    
-    # Convert sets to lists for JSON serialization
-    for date_str in calendar_data:
-        calendar_data[date_str]['subjects'] = list(calendar_data[date_str]['subjects'])
+    for session_date, subject, session_count, minutes in rows:
+        day = calendar_data.setdefault(session_date.isoformat(), {
+            'sessions': 0,
+            'total_minutes': 0,
+            'subjects': []
+        })
+        day['sessions'] += session_count
+        day['total_minutes'] += minutes
+        day['subjects'].append(subject)
     
     return calendar_data
 
@@ -404,30 +567,29 @@ def get_study_history_data(user_id):
     if not user:
         return None
     
-    # Get all sessions ordered by date (newest first)
-    sessions = StudySession.query.filter_by(user_id=user_id).order_by(StudySession.session_date.desc(), StudySession.start_time.desc()).all()
-    
-    if not sessions:
-        return {
-            'user': user,
-            'sessions': [],
-            'subjects': [],
-            'total_time': 0,
-            'completed_count': 0
-        }
-    
-    # Get unique subjects
-    subjects = list(set(session.subject for session in sessions))
-    subjects.sort()
+    # Stream all sessions ordered by date (newest first), totalling them in the same pass
+    result = db.session.execute(
+        select(*SESSION_DISPLAY_COLUMNS)
+        .where(StudySession.user_id == user_id)
+        .order_by(StudySession.session_date.desc(), StudySession.start_time.desc())
+        .execution_options(yield_per=500)
+    )
     
-    # Calculate totals
-    total_time = sum(session.duration_minutes for session in sessions if session.duration_minutes)
-    completed_count = sum(1 for session in sessions if session.completed)
+    sessions = []
+    subjects = set()
+    total_time = 0
+    completed_count = 0
+    for session in result:
+        sessions.append(session)
+        subjects.add(session.subject)
+        total_time += session.duration_minutes or 0
+        if session.completed:
+            completed_count += 1
     
     return {
         'user': user,
         'sessions': sessions,
-        'subjects': subjects,
+        'subjects': sorted(subjects),
         'total_time': total_time,
         'completed_count': completed_count
     }
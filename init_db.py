@@ -7,7 +7,7 @@ Run this to set up the database with tables and default data
 import os
 import sys
 from app import app, db
-from models import create_default_badges, User, Badge, StudySession, Streak, UserBadge
+from models import create_default_badges, ensure_indexes, User, Badge, StudySession, Streak, UserBadge
 
 def init_database():
     """Initialize the database with tables and default data"""
@@ -18,6 +18,7 @@ def init_database():
             # Create all tables
             print("📊 Creating database tables...")
             db.create_all()
+            ensure_indexes()
             print("✅ Database tables created successfully!")
             
             # Create default badges
@@ -3,10 +3,23 @@ Database Models for Study Streak Motivator
 Congressional App Challenge 2025
 """
 
+import sys
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, date
+from typing import FrozenSet, NamedTuple, Optional, Tuple
+from sqlalchemy import text
 from sqlalchemy.orm import relationship
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(value):
+        return orjson.dumps(value).decode('utf-8')
+except ImportError:  # Fall back to the stdlib encoder
+    import json
+    _json_loads = json.loads
+    _json_dumps = json.dumps
+
 db = SQLAlchemy()
 
 class User(db.Model):
@@ -39,14 +52,26 @@ class User(db.Model):
     
     def get_total_study_time(self):
         """Get total study time in minutes"""
-        sessions = StudySession.query.filter_by(user_id=self.id).all()
-        return sum(session.duration_minutes for session in sessions if session.duration_minutes)
+        return db.session.query(
+            db.func.coalesce(db.func.sum(StudySession.duration_minutes), 0)
+        ).filter_by(user_id=self.id).scalar()
 
 class StudySession(db.Model):
     """
     Study Session model to track individual study periods
     """
     __tablename__ = 'study_sessions'
+    __table_args__ = (
+        # Nearly every query filters by user and completion, then by date; carrying the
+        # start time and minutes lets the daily/weekly/hourly rollups read only the index
+        db.Index('ix_sess_user_completed_date_rollup', 'user_id', 'completed', 'session_date',
+                 'start_time', 'duration_minutes'),
+        # Covers the badge engine's per-subject totals and longest-session lookups
+        db.Index('ix_sess_user_completed_subject', 'user_id', 'completed', 'subject', 'duration_minutes'),
+        db.Index('ix_sess_user_completed_duration', 'user_id', 'completed', 'duration_minutes'),
+        # Recent-session lists order a user's sessions by start time
+        db.Index('ix_sess_user_start', 'user_id', 'start_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -63,16 +88,22 @@ class StudySession(db.Model):
     def __repr__(self):
         return f'<StudySession {self.subject} - {self.duration_minutes}min>'
     
-    def mark_completed(self):
+    def mark_completed(self, commit=True):
         """Mark session as completed and update completion time"""
         self.completed = True
-        db.session.commit()
+        if commit:
+            db.session.commit()
 
 class Streak(db.Model):
     """
     Streak model to track consecutive study days
     """
     __tablename__ = 'streaks'
+    __table_args__ = (
+        # Every streak lookup asks for a user's active streak; only those rows are indexed
+        db.Index('ix_streak_active', 'user_id',
+                 sqlite_where=text('is_active = 1'), postgresql_where=text('is_active = true')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -88,23 +119,38 @@ class Streak(db.Model):
     def __repr__(self):
         return f'<Streak {self.current_days} days - {"Active" if self.is_active else "Ended"}>'
     
-    def extend_streak(self):
+    def extend_streak(self, commit=True):
         """Extend the current streak by one day"""
         if self.is_active:
             self.current_days += 1
-            db.session.commit()
+            if commit:
+                db.session.commit()
     
-    def break_streak(self):
+    def break_streak(self, commit=True):
         """End the current streak"""
         self.is_active = False
         self.end_date = date.today()
-        db.session.commit()
+        if commit:
+            db.session.commit()
+
+class BadgeCriteria(NamedTuple):
+    """Typed view of the criteria_details fields the badge checks read"""
+    condition: Optional[str] = None
+    hour: Optional[int] = None
+    subject: Optional[str] = None
+    subjects: FrozenSet[str] = frozenset()
+    rarities: Tuple[str, ...] = ()
 
 class Badge(db.Model):
     """
     Enhanced Badge model for comprehensive achievement system - Phase 6
     """
     __tablename__ = 'badges'
+    __table_args__ = (
+        # Rarity-based meta achievements only count active, non-secret badges
+        db.Index('ix_badge_active_rarity', 'is_active', 'rarity',
+                 sqlite_where=text('is_secret = 0'), postgresql_where=text('is_secret = false')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -137,19 +183,44 @@ class Badge(db.Model):
         return f'<Badge {self.name} ({self.tier} {self.rarity})>'
     
     def get_criteria_details(self):
-        """Parse criteria_details JSON if present"""
-        if self.criteria_details:
+        """Parse criteria_details JSON if present (cached on the instance until the string changes)"""
+        raw = self.criteria_details
+        cached = self.__dict__.get('_criteria_cache')
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        
+        details = {}
+        if raw:
             try:
-                import json
-                return json.loads(self.criteria_details)
+                details = _json_loads(raw)
             except:
-                return {}
-        return {}
+                details = {}
+        self._criteria_cache = (raw, details)
+        return details
+    
+    @property
+    def criteria(self):
+        """criteria_details as a BadgeCriteria, rebuilt only when the parsed details change"""
+        details = self.get_criteria_details()
+        cached = self.__dict__.get('_criteria_fields')
+        if cached is not None and cached[0] is details:
+            return cached[1]
+        
+        # Subject names are interned so lookups against the (also interned) snapshot keys match by identity
+        subject = details.get('subject')
+        fields = BadgeCriteria(
+            condition=details.get('condition'),
+            hour=details.get('hour'),
+            subject=sys.intern(subject) if isinstance(subject, str) else subject,
+            subjects=frozenset(sys.intern(name) for name in details.get('subjects', ())),
+            rarities=tuple(details.get('rarities', ()))
+        )
+        self._criteria_fields = (details, fields)
+        return fields
     
     def set_criteria_details(self, details_dict):
         """Set criteria_details as JSON string"""
-        import json
-        self.criteria_details = json.dumps(details_dict)
+        self.criteria_details = _json_dumps(details_dict)
 
 class UserBadge(db.Model):
     """
@@ -166,8 +237,12 @@ class UserBadge(db.Model):
     user = relationship("User", back_populates="user_badges")
     badge = relationship("Badge", back_populates="user_badges")
     
-    # Ensure a user can only earn each badge once
-    __table_args__ = (db.UniqueConstraint('user_id', 'badge_id', name='unique_user_badge'),)
+    __table_args__ = (
+        # Ensure a user can only earn each badge once
+        db.UniqueConstraint('user_id', 'badge_id', name='unique_user_badge'),
+        # Earned-badge lists read a user's badge ids newest first straight from this index
+        db.Index('ix_user_badges_user_earned', 'user_id', 'earned_at', 'badge_id'),
+    )
     
     def __repr__(self):
         return f'<UserBadge User:{self.user_id} Badge:{self.badge_id}>'
@@ -227,17 +302,40 @@ def create_default_badges():
             }
         ]
         
-        for badge_data in default_badges:
-            # Check if badge already exists
-            existing_badge = Badge.query.filter_by(name=badge_data['name']).first()
-            if not existing_badge:
-                badge = Badge(**badge_data)
-                db.session.add(badge)
+        dialect_name = db.session.get_bind().dialect.name
+        if dialect_name in ('sqlite', 'postgresql'):
+            # One INSERT for every badge, skipping names that already exist
+            if dialect_name == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(Badge).values(default_badges).on_conflict_do_nothing(index_elements=['name'])
+            db.session.execute(stmt)
+        else:
+            existing_names = {name for (name,) in db.session.query(Badge.name)}
+            db.session.bulk_insert_mappings(
+                Badge, [badge_data for badge_data in default_badges if badge_data['name'] not in existing_names]
+            )
         
         try:
             db.session.commit()
-            return True
         except Exception as e:
             db.session.rollback()
             print(f"Error creating basic badges: {e}")
             return False
+        
+        from db_utils import invalidate_badge_catalog
+        invalidate_badge_catalog()
+        return True
+
+def ensure_indexes():
+    """
+    Create any model indexes missing from an existing database and refresh planner stats
+    db.create_all() skips tables that already exist, so their new indexes need this
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
@@ -28,19 +28,30 @@ class Avatar(db.Model):
     eye_style = db.Column(db.String(50), nullable=True)
     outfit = db.Column(db.String(50), nullable=True)
     
-    # Relationships
-    user = db.relationship('User', backref=db.backref('avatar', uselist=False))
-    equipped_items = db.relationship('EquippedItem', back_populates='avatar')
-    skills = db.relationship('AvatarSkill', back_populates='avatar')
+    # Relationships (collections shown with the avatar load in one extra SELECT each).
+    # User.avatar stays lazy so plain User loads don't join avatars; pages that render it
+    # can opt in with joinedload(User.avatar)
+    user = db.relationship('User', backref=db.backref('avatar', uselist=False, lazy='select'))
+    equipped_items = db.relationship('EquippedItem', back_populates='avatar', lazy='selectin')
+    skills = db.relationship('AvatarSkill', back_populates='avatar', lazy='selectin')
+    
+    # XP needed per level
+    LEVEL_XP = 1000
     
     def __repr__(self):
         return f'<Avatar {self.name} (Level {self.level})>'
     
+    @staticmethod
+    def xp_to_level(xp):
+        """Level for a total XP: level = XP/1000 rounded down + 1"""
+        return xp // Avatar.LEVEL_XP + 1
+    
     def add_xp(self, amount):
         """Add XP and handle level ups"""
+        if not amount:
+            return False  # Leave the row clean so the session has nothing to UPDATE
         self.xp += amount
-        # Simple level calculation: level = XP/1000 rounded down + 1
-        new_level = (self.xp // 1000) + 1
+        new_level = Avatar.xp_to_level(self.xp)
         if new_level > self.level:
             self.level = new_level
             return True  # Indicates level up occurred
@@ -79,7 +90,7 @@ class EquippedItem(db.Model):
     
     # Relationships
     avatar = db.relationship('Avatar', back_populates='equipped_items')
-    item = db.relationship('Item')
+    item = db.relationship('Item', lazy='joined')
     
     __table_args__ = (db.UniqueConstraint('avatar_id', 'item_id', name='unique_equipped_item'),)
 
@@ -96,8 +107,8 @@ class Inventory(db.Model):
     acquisition_type = db.Column(db.String(20), nullable=False)  # purchased, rewarded, achievement
     
     # Relationships
-    user = db.relationship('User', backref='inventory_items')
-    item = db.relationship('Item')
+    user = db.relationship('User', backref=db.backref('inventory_items', lazy='select'))
+    item = db.relationship('Item', lazy='joined')
     
     __table_args__ = (db.UniqueConstraint('user_id', 'item_id', name='unique_inventory_item'),)
 
@@ -134,7 +145,7 @@ class AvatarSkill(db.Model):
     
     # Relationships
     avatar = db.relationship('Avatar', back_populates='skills')
-    skill = db.relationship('Skill')
+    skill = db.relationship('Skill', lazy='joined')
     
     __table_args__ = (db.UniqueConstraint('avatar_id', 'skill_id', name='unique_avatar_skill'),)
 
@@ -206,9 +217,12 @@ class Leaderboard(db.Model):
     user = db.relationship('User')
 
 # Update User model relationships (to be added to models.py when implementing Phase 9)
+# Until then User can't name these classes, so the models above attach them as backrefs
 """
 # Add to User model:
-avatar = db.relationship('Avatar', back_populates='user', uselist=False)
-inventory_items = db.relationship('Inventory', back_populates='user')
+avatar = db.relationship('Avatar', back_populates='user', uselist=False, lazy='select')
+inventory_items = db.relationship('Inventory', back_populates='user', lazy='select')
 quests = db.relationship('UserQuest', back_populates='user')
+
+# ...and switch the backrefs above to back_populates='avatar' / 'inventory_items' / 'quests'
 """
\ No newline at end of file
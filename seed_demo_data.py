@@ -14,24 +14,27 @@ from app import app
 from models import db, User, StudySession, Streak, Badge, UserBadge
 from db_utils import (
     get_user_by_username,
-    create_study_session,
     check_and_award_badges,
 )
 from streak_calculator import update_streak
 
 
-def reset_user_data(user_id: int) -> None:
-    """Remove existing sessions, streaks, and earned badges for the user."""
+def reset_user_data(user_id: int, commit: bool = True) -> None:
+    """Remove existing sessions, streaks, and earned badges for the user.
+    With commit=False the deletes stay in the caller's open transaction.
+    """
     # Delete in dependency-safe order: sessions, streaks, user_badges
     StudySession.query.filter_by(user_id=user_id).delete()
     Streak.query.filter_by(user_id=user_id).delete()
     UserBadge.query.filter_by(user_id=user_id).delete()
-    db.session.commit()
+    if commit:
+        db.session.commit()
 
 
-def add_sessions_for_window(user_id: int, today: date) -> Tuple[int, int]:
+def add_sessions_for_window(user_id: int, today: date, commit: bool = True) -> Tuple[int, int]:
     """Create a curated set of sessions for days 18–21 Oct relative to today=Oct 22.
     Returns total_sessions, total_minutes.
+    With commit=False the inserts stay in the caller's open transaction.
     """
     # Target dates to build a 4-day streak ending yesterday
     d21 = today - timedelta(days=1)
@@ -48,81 +51,86 @@ def add_sessions_for_window(user_id: int, today: date) -> Tuple[int, int]:
         (d21, 'Math', 15), (d21, 'History', 10), (d21, 'History', 10),
     ]
 
-    total_minutes = 0
-    for sess_date, subject, minutes in plan:
-        s = create_study_session(user_id, subject, minutes, session_date=sess_date)
-        s.completed = True
-        # Make deterministic-ish start times in the afternoon to avoid special time badges
-        # e.g., 16:00 local-equivalent in UTC baseline
-        s.start_time = datetime.utcnow().replace(hour=16, minute=0, second=0, microsecond=0)
-        db.session.add(s)
-        total_minutes += minutes
-
-    db.session.commit()
+    # Make deterministic-ish start times in the afternoon to avoid special time badges
+    # e.g., 16:00 local-equivalent in UTC baseline
+    start_time = datetime.utcnow().replace(hour=16, minute=0, second=0, microsecond=0)
+
+    # Insert the whole plan in one batch
+    db.session.bulk_insert_mappings(StudySession, [
+        {
+            'user_id': user_id,
+            'subject': subject,
+            'duration_minutes': minutes,
+            'session_date': sess_date,
+            'start_time': start_time,
+            'completed': True,
+        }
+        for sess_date, subject, minutes in plan
+    ])
+    if commit:
+        db.session.commit()
+
+    total_minutes = sum(minutes for _, _, minutes in plan)
     return len(plan), total_minutes
 
 
 def seed_demo_data():
     print("🔁 Seeding controlled demo data...")
     with app.app_context():
+        # Every step below only flushes; the whole seed is committed once at the end
         user = get_user_by_username('student')
         if not user:
             # Create default user if missing
             user = User(username='student', email='student@example.com')
             db.session.add(user)
-            db.session.commit()
+            db.session.flush()
             print("👤 Created default user 'student'")
 
         # Clear existing demo data
-        reset_user_data(user.id)
+        reset_user_data(user.id, commit=False)
 
         # Compute 'today' as actual current local date
         today = date.today()
 
         # Add curated sessions (only Math/History), keep < 4h total
-        total_sessions, total_minutes = add_sessions_for_window(user.id, today)
+        total_sessions, total_minutes = add_sessions_for_window(user.id, today, commit=False)
 
         # Update streaks (should be 4 days as of today with no session today)
-        streak_info = update_streak(user.id)
+        streak_info = update_streak(user.id, commit=False)
 
         # Award badges based on real criteria from created data
-        _ = check_and_award_badges(user.id)
+        _ = check_and_award_badges(user.id, commit=False)
         
         # Ensure we end with EXACTLY 6 earned badges
         target_names = [
             'First Steps', 'Spark Ignited', 'Flame Keeper',
             'Quick Learner', 'Session Starter', 'Focus Master'
         ]
-        # Build the desired set based on availability
-        desired: List[Badge] = []
-        for name in target_names:
-            b = Badge.query.filter_by(name=name).first()
-            if b and b.is_active and not b.is_secret:
-                desired.append(b)
-        # If some desired badges don't exist, fill with any active non-secret badge
+        # Build the desired set based on availability, in target order
+        visible = (Badge.is_active == True, Badge.is_secret.isnot(True))
+        by_name = {b.name: b for b in Badge.query.filter(Badge.name.in_(target_names), *visible)}
+        desired: List[Badge] = [by_name[name] for name in target_names if name in by_name]
+        # If some desired badges don't exist, fill with just enough other active non-secret badges
         if len(desired) < 6:
-            fillers = Badge.query.filter(Badge.is_active == True).all()
-            seen = {b.id for b in desired}
-            for b in fillers:
-                if b.id not in seen and not b.is_secret:
-                    desired.append(b)
-                    seen.add(b.id)
-                if len(desired) >= 6:
-                    break
+            desired += Badge.query.filter(
+                *visible, Badge.id.notin_([b.id for b in desired])
+            ).order_by(Badge.id).limit(6 - len(desired)).all()
         # Current earned
-        current_ubs = UserBadge.query.filter_by(user_id=user.id).all()
-        current_ids = {ub.badge_id for ub in current_ubs}
+        current_ids = {bid for (bid,) in db.session.query(UserBadge.badge_id).filter_by(user_id=user.id)}
         desired_ids = {b.id for b in desired[:6]}
         
-        # Add missing desired badges
-        for bid in desired_ids - current_ids:
-            db.session.add(UserBadge(user_id=user.id, badge_id=bid))
-        db.session.commit()
+        # Add missing desired badges in one batch
+        missing_ids = desired_ids - current_ids
+        if missing_ids:
+            db.session.bulk_insert_mappings(UserBadge, [
+                {'user_id': user.id, 'badge_id': bid} for bid in missing_ids
+            ])
         
-        # Remove any extras beyond the desired 6
-        extras = [ub for ub in UserBadge.query.filter_by(user_id=user.id).all() if ub.badge_id not in desired_ids]
-        for ub in extras:
-            db.session.delete(ub)
+        # Remove any extras beyond the desired 6 with a single DELETE
+        UserBadge.query.filter(
+            UserBadge.user_id == user.id,
+            ~UserBadge.badge_id.in_(desired_ids)
+        ).delete(synchronize_session=False)
         db.session.commit()
 
         # Final summary
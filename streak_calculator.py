@@ -6,8 +6,10 @@ Congressional App Challenge 2025
 
 from datetime import date, datetime, timedelta
 from dateutil import tz
+from sqlalchemy import func
 from models import db, User, StudySession, Streak
-from typing import Optional, Tuple, Dict, List
+import db_utils
+from typing import Optional, Set, Tuple, Dict, List
 
 # Configuration Constants
 MIN_STUDY_MINUTES = 5  # Minimum minutes for a session to count toward streak
@@ -57,90 +59,97 @@ class StreakCalculator:
         Returns:
             Tuple of (has_valid_sessions, total_study_minutes)
         """
-        sessions = StudySession.query.filter_by(
+        # Summed in SQL so the lookup reads only the (user_id, completed, session_date, ...) index
+        total_minutes = db.session.query(
+            func.coalesce(func.sum(StudySession.duration_minutes), 0)
+        ).filter(
+            StudySession.user_id == user_id,
+            StudySession.completed == True,
+            StudySession.session_date == target_date,
+            StudySession.duration_minutes >= self.min_study_minutes
+        ).scalar()
+        
+        return total_minutes >= self.min_study_minutes, total_minutes
+    
+    def _get_qualifying_dates(self, user_id: int) -> Set[date]:
+        """
+        Get every date on which the user has a valid study day, in one grouped query
+        
+        A day is valid when it has a completed session of at least min_study_minutes,
+        the same rule has_valid_study_day applies to a single date
+        
+        Args:
+            user_id: User ID to check
+            
+        Returns:
+            Set of qualifying session dates
+        """
+        rows = db.session.query(StudySession.session_date).filter_by(
             user_id=user_id,
-            session_date=target_date,
             completed=True
+        ).filter(
+            StudySession.duration_minutes >= self.min_study_minutes
+        ).group_by(StudySession.session_date).having(
+            func.sum(StudySession.duration_minutes) >= self.min_study_minutes
         ).all()
         
-        total_minutes = sum(
-            session.duration_minutes 
-            for session in sessions 
-            if session.duration_minutes and session.duration_minutes >= self.min_study_minutes
-        )
-        
-        return total_minutes >= self.min_study_minutes, total_minutes
+        return {row[0] for row in rows}
     
-    def calculate_current_streak(self, user_id: int) -> Tuple[int, Optional[date]]:
+    def calculate_current_streak(self, user_id: int,
+                                 qualifying_dates: Optional[Set[date]] = None,
+                                 today: Optional[date] = None) -> Tuple[int, Optional[date]]:
         """
         Calculate the user's current active streak
         
         Args:
             user_id: User ID to calculate streak for
+            qualifying_dates: Dates from _get_qualifying_dates, if already loaded
+            today: Local date from get_local_date, if the caller already has it
             
         Returns:
             Tuple of (streak_days, streak_start_date)
         """
-        today = self.get_local_date()
+        if qualifying_dates is None:
+            qualifying_dates = self._get_qualifying_dates(user_id)
+        if today is None:
+            today = self.get_local_date()
+        
         current_streak_days = 0
         streak_start_date = None
         
-        # Check backwards from today to find consecutive study days
-        check_date = today
-        while True:
-            has_valid_day, _ = self.has_valid_study_day(user_id, check_date)
-            
-            if has_valid_day:
-                current_streak_days += 1
-                streak_start_date = check_date
-                check_date -= timedelta(days=1)
-            else:
-                break
-        
-        # If no study today, check if yesterday was studied (grace period)
-        if current_streak_days == 0:
-            yesterday = today - timedelta(days=1)
-            has_yesterday, _ = self.has_valid_study_day(user_id, yesterday)
-            
-            if has_yesterday:
-                # Start from yesterday and count backwards
-                current_streak_days = 1
-                streak_start_date = yesterday
-                check_date = yesterday - timedelta(days=1)
-                
-                while True:
-                    has_valid_day, _ = self.has_valid_study_day(user_id, check_date)
-                    if has_valid_day:
-                        current_streak_days += 1
-                        streak_start_date = check_date
-                        check_date -= timedelta(days=1)
-                    else:
-                        break
+        # Count back from today, or from yesterday if there is no study today (grace period)
+        check_date = today if today in qualifying_dates else today - timedelta(days=1)
+        while check_date in qualifying_dates:
+            current_streak_days += 1
+            streak_start_date = check_date
+            check_date -= timedelta(days=1)
         
         return current_streak_days, streak_start_date
     
-    def calculate_longest_streak(self, user_id: int) -> Tuple[int, Optional[date], Optional[date]]:
+    def calculate_longest_streak(self, user_id: int,
+                                 qualifying_dates: Optional[Set[date]] = None
+                                 ) -> Tuple[int, Optional[date], Optional[date]]:
         """
         Calculate the user's longest streak ever
         
         Args:
             user_id: User ID to calculate for
+            qualifying_dates: Dates from _get_qualifying_dates, if already loaded
             
         Returns:
             Tuple of (longest_streak_days, start_date, end_date)
         """
-        # Get all completed study sessions ordered by date
-        sessions = db.session.query(StudySession.session_date).filter_by(
-            user_id=user_id,
-            completed=True
-        ).filter(
-            StudySession.duration_minutes >= self.min_study_minutes
-        ).group_by(StudySession.session_date).order_by(StudySession.session_date).all()
-        
-        if not sessions:
+        if qualifying_dates is None:
+            # Nothing loaded yet, so let the database find the longest run when it can
+            longest = self._query_longest_streak(user_id)
+            if longest is not None:
+                return longest
+            qualifying_dates = self._get_qualifying_dates(user_id)
+        
+        if not qualifying_dates:
             return 0, None, None
         
-        study_dates = [session[0] for session in sessions]
+        study_dates = sorted(qualifying_dates)
         
         longest_streak = 0
         longest_start = None
@@ -175,28 +184,80 @@ class StreakCalculator:
         
         return longest_streak, longest_start, longest_end
     
-    def update_user_streak(self, user_id: int) -> Dict:
+    def _query_longest_streak(self, user_id: int) -> Optional[Tuple[int, Optional[date], Optional[date]]]:
+        """
+        Find the longest run of consecutive study days in SQL (gaps and islands)
+        
+        Numbering the qualifying dates in order and subtracting that number from the
+        date's day number gives a key shared by every date in the same consecutive run
+        
+        Args:
+            user_id: User ID to calculate for
+            
+        Returns:
+            Tuple of (longest_streak_days, start_date, end_date), or None when the
+            database lacks window functions and the caller must compute it in Python
+        """
+        bind = db.session.get_bind()
+        if bind.dialect.name == 'sqlite' and bind.dialect.dbapi.sqlite_version_info >= (3, 25):
+            day_number = func.julianday(StudySession.session_date)
+        elif bind.dialect.name == 'postgresql':
+            day_number = func.extract('epoch', StudySession.session_date) / 86400
+        else:
+            return None
+        
+        study_days = db.session.query(
+            StudySession.session_date.label('study_date'),
+            (day_number - func.row_number().over(order_by=StudySession.session_date)).label('island')
+        ).filter_by(
+            user_id=user_id,
+            completed=True
+        ).filter(
+            StudySession.duration_minutes >= self.min_study_minutes
+        ).group_by(StudySession.session_date).subquery()
+        
+        # Ties go to the earliest run, like the Python walk
+        longest = db.session.query(
+            func.count(),
+            func.min(study_days.c.study_date),
+            func.max(study_days.c.study_date)
+        ).group_by(study_days.c.island).order_by(
+            func.count().desc(), func.min(study_days.c.study_date)
+        ).first()
+        
+        if longest is None:
+            return 0, None, None
+        return tuple(longest)
+    
+    def update_user_streak(self, user_id: int, commit: bool = True) -> Dict:
         """
         Update user's streak after a study session
         
         Args:
             user_id: User ID to update
+            commit: Commit the change, or only flush it so the caller can
+                commit it together with other writes
             
         Returns:
             Dictionary with streak update information
         """
-        current_streak_days, streak_start = self.calculate_current_streak(user_id)
-        longest_streak_days, longest_start, longest_end = self.calculate_longest_streak(user_id)
+        today = self.get_local_date()
+        qualifying_dates = self._get_qualifying_dates(user_id)
+        current_streak_days, streak_start = self.calculate_current_streak(user_id, qualifying_dates, today)
+        longest_streak_days, longest_start, longest_end = self.calculate_longest_streak(user_id, qualifying_dates)
+        
+        # Streak-based badge progress moves with the streak
+        _invalidate_badge_progress(user_id)
         
         # Get or create current streak record
-        active_streak = Streak.query.filter_by(user_id=user_id, is_active=True).first()
+        active_streak = get_current_streak(user_id)
         
         if current_streak_days == 0:
             # No current streak - mark existing as inactive
             if active_streak:
                 active_streak.is_active = False
-                active_streak.end_date = self.get_local_date() - timedelta(days=1)
-                db.session.commit()
+                active_streak.end_date = today - timedelta(days=1)
+                self._save(commit)
             
             return {
                 'current_streak': 0,
@@ -220,7 +281,7 @@ class StreakCalculator:
             )
             db.session.add(active_streak)
         
-        db.session.commit()
+        self._save(commit)
         
         # Check if this is a new personal record
         new_record = current_streak_days > longest_streak_days
@@ -233,6 +294,13 @@ class StreakCalculator:
             'streak_start_date': streak_start.isoformat() if streak_start else None
         }
     
+    def _save(self, commit: bool) -> None:
+        """Commit pending streak changes, or just flush them into the open transaction"""
+        if commit:
+            db.session.commit()
+        else:
+            db.session.flush()
+    
     def get_streak_status(self, user_id: int) -> Dict:
         """
         Get comprehensive streak status for a user
@@ -245,10 +313,11 @@ class StreakCalculator:
         """
         today = self.get_local_date()
         has_studied_today, today_minutes = self.has_valid_study_day(user_id, today)
-        has_studied_yesterday, _ = self.has_valid_study_day(user_id, today - timedelta(days=1))
         
-        current_streak_days, streak_start = self.calculate_current_streak(user_id)
-        longest_streak_days, longest_start, longest_end = self.calculate_longest_streak(user_id)
+        qualifying_dates = self._get_qualifying_dates(user_id)
+        has_studied_yesterday = today - timedelta(days=1) in qualifying_dates
+        current_streak_days, streak_start = self.calculate_current_streak(user_id, qualifying_dates, today)
+        longest_streak_days, longest_start, longest_end = self.calculate_longest_streak(user_id, qualifying_dates)
         
         # Determine streak status
         if current_streak_days == 0:
@@ -290,10 +359,11 @@ class StreakCalculator:
         Returns:
             Dictionary with calendar data
         """
+        today = self.get_local_date()
         if year is None:
-            year = self.get_local_date().year
+            year = today.year
         if month is None:
-            month = self.get_local_date().month
+            month = today.month
         
         # Get first and last day of the month
         first_day = date(year, month, 1)
@@ -302,36 +372,58 @@ class StreakCalculator:
         else:
             last_day = date(year, month + 1, 1) - timedelta(days=1)
         
-        calendar_data = {}
-        current_date = first_day
+        # Total the month's qualifying minutes per day in one grouped query, bucketed by day offset
+        daily_totals = db.session.query(
+            StudySession.session_date,
+            func.sum(StudySession.duration_minutes)
+        ).filter(
+            StudySession.user_id == user_id,
+            StudySession.completed == True,
+            StudySession.session_date >= first_day,
+            StudySession.session_date <= last_day,
+            StudySession.duration_minutes >= self.min_study_minutes
+        ).group_by(StudySession.session_date).all()
         
-        while current_date <= last_day:
-            has_valid_day, total_minutes = self.has_valid_study_day(user_id, current_date)
-            
+        first_ordinal = first_day.toordinal()
+        minutes_by_day = [0] * (last_day.toordinal() - first_ordinal + 1)
+        for session_date, minutes in daily_totals:
+            minutes_by_day[session_date.toordinal() - first_ordinal] = minutes
+        
+        calendar_data = {}
+        for offset, total_minutes in enumerate(minutes_by_day):
+            current_date = date.fromordinal(first_ordinal + offset)
             calendar_data[current_date.isoformat()] = {
-                'has_streak_activity': has_valid_day,
+                'has_streak_activity': total_minutes >= self.min_study_minutes,
                 'total_study_minutes': total_minutes,
-                'is_today': current_date == self.get_local_date()
+                'is_today': current_date == today
             }
-            
-            current_date += timedelta(days=1)
         
         return calendar_data
 
 
+def _invalidate_badge_progress(user_id: int) -> None:
+    """Drop the user's cached badge progress (badge_engine imports this module, so import lazily)"""
+    try:
+        from badge_engine import invalidate_badge_progress
+    except ImportError:
+        return
+    invalidate_badge_progress(user_id)
+
+
 # Global instance for easy access
 streak_calculator = StreakCalculator()
 
 
 # Convenience functions for backward compatibility
-def update_streak(user_id: int) -> Dict:
+def update_streak(user_id: int, commit: bool = True) -> Dict:
     """Update user streak (backward compatible)"""
-    return streak_calculator.update_user_streak(user_id)
+    return streak_calculator.update_user_streak(user_id, commit)
 
 
 def get_current_streak(user_id: int) -> Optional[Streak]:
     """Get current streak model (backward compatible)"""
-    return Streak.query.filter_by(user_id=user_id, is_active=True).first()
+    # One cached lambda_stmt lookup, kept in db_utils
+    return db_utils.get_current_streak(user_id)
 
 
 def get_streak_status(user_id: int) -> Dict:
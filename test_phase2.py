@@ -4,9 +4,38 @@ Test script for Phase 2 database functionality
 Demonstrates CRUD operations and business logic
 """
 
+from contextlib import contextmanager
 from app import app
 from db_utils import *
 from datetime import date
+from sqlalchemy import event
+from sqlalchemy.orm import raiseload
+
+# Most SQL statements building the dashboard may issue; catches N+1 regressions
+DASHBOARD_QUERY_BUDGET = 12
+
+@contextmanager
+def no_lazy_loads():
+    """
+    Count SQL statements and make every ORM query raiseload('*'), so any
+    relationship that isn't loaded explicitly raises instead of running a query
+    """
+    queries = []
+    
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+    
+    def raise_on_lazy_load(state):
+        if state.is_select and not state.is_column_load and not state.is_relationship_load:
+            state.statement = state.statement.options(raiseload('*'))
+    
+    event.listen(db.engine, 'before_cursor_execute', count_query)
+    event.listen(db.session, 'do_orm_execute', raise_on_lazy_load)
+    try:
+        yield queries
+    finally:
+        event.remove(db.session, 'do_orm_execute', raise_on_lazy_load)
+        event.remove(db.engine, 'before_cursor_execute', count_query)
 
 def test_phase2():
     """Test Phase 2 database functionality"""
@@ -32,8 +61,9 @@ def test_phase2():
         if new_badges:
             print(f"   🏆 New badges earned: {[badge.name for badge in new_badges]}")
         
-        complete_study_session(session2.id)
-        complete_study_session(session3.id)
+        _, batch_badges = complete_study_sessions([session2.id, session3.id])
+        if batch_badges:
+            print(f"   🏆 New badges earned: {[badge.name for badge in batch_badges]}")
         print("   Completed all sessions")
         
         # Test 4: Check streak
@@ -53,7 +83,11 @@ def test_phase2():
         
         # Test 6: Get dashboard data
         print("\n6️⃣ Testing dashboard data...")
-        dashboard_data = get_dashboard_data(user.id)
+        db.session.expire_all()
+        with no_lazy_loads() as queries:
+            dashboard_data = get_dashboard_data(user.id)
+        print(f"   Queries issued: {len(queries)} (budget {DASHBOARD_QUERY_BUDGET})")
+        assert len(queries) <= DASHBOARD_QUERY_BUDGET, f"dashboard issued {len(queries)} queries"
         print(f"   Total study time: {dashboard_data['total_study_time']} minutes")
         print(f"   Total sessions: {dashboard_data['total_sessions']}")
         print(f"   Current streak: {dashboard_data['current_streak']} days")
@@ -4,108 +4,138 @@ Tests various edge cases and scenarios for robust streak tracking
 Congressional App Challenge 2025
 """
 
+import importlib.util
 import sys
 import os
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
 
 # Add project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app
-from models import db, User, StudySession, Streak
-from streak_calculator import StreakCalculator, get_streak_status
+from models import db, User, StudySession
+from streak_calculator import StreakCalculator, get_current_streak, get_streak_status
+from sqlalchemy import event, func, insert
 import json
+import pytest
+
+# Shared user for every test, inserted once per module by _canonical_test_user
+TEST_USER_ID = None
+
+# StreakCalculator holds only config, so one instance serves every test
+_CALCULATOR = StreakCalculator()
+
+# Set TEST_VERBOSE=1 to dump full results instead of one-line summaries
+VERBOSE = bool(os.environ.get('TEST_VERBOSE'))
+
+@pytest.fixture(scope="module", autouse=True)
+def _canonical_test_user(_app):
+    """Insert the shared test user once; each test's own rows roll back around it"""
+    global TEST_USER_ID
+    with _app.app_context():
+        TEST_USER_ID = db.session.query(User.id).filter_by(username='test_user').scalar()
+        if TEST_USER_ID is None:
+            db.session.bulk_insert_mappings(User, [{'username': 'test_user', 'email': 'test@example.com'}])
+            db.session.commit()
+            TEST_USER_ID = db.session.query(User.id).filter_by(username='test_user').scalar()
 
 def setup_test_database():
-    """Create a clean test database"""
-    with app.app_context():
-        # Drop all tables and recreate them
-        db.drop_all()
-        db.create_all()
-        
-        # Create test user
-        test_user = User(username='test_user', email='test@example.com')
-        db.session.add(test_user)
-        db.session.commit()
-        
-        return test_user.id
+    """Return the shared test user's id (call inside the db_session fixture)"""
+    return TEST_USER_ID
 
-def create_test_session(user_id, session_date, duration_minutes=25, subject="Math", completed=True):
-    """Helper to create a test study session"""
-    with app.app_context():
-        session = StudySession(
-            user_id=user_id,
-            subject=subject,
-            duration_minutes=duration_minutes,
-            session_date=session_date,
-            start_time=datetime.combine(session_date, datetime.min.time()),
-            completed=completed
-        )
-        db.session.add(session)
-        db.session.commit()
-        return session
+def _days_before(today, days):
+    """Date `days` before `today`, without building a timedelta"""
+    return date.fromordinal(today.toordinal() - days)
 
-def test_basic_streak_calculation():
+def _test_session_mapping(user_id, session_date, duration_minutes=25, subject="Math", completed=True):
+    """Build the column mapping for one test study session"""
+    return {
+        'user_id': user_id,
+        'subject': subject,
+        'duration_minutes': duration_minutes,
+        'session_date': session_date,
+        'start_time': datetime(session_date.year, session_date.month, session_date.day),
+        'completed': completed,
+    }
+
+def create_test_sessions(user_id, specs):
+    """Helper to insert several test study sessions in one statement with a single commit
+    Each spec is (session_date[, duration_minutes[, subject[, completed]]])
+    Call inside the db_session fixture
+    """
+    rows = [_test_session_mapping(user_id, *spec) for spec in specs]
+    if rows:
+        # One executemany INSERT for every row
+        db.session.execute(insert(StudySession), rows)
+    db.session.commit()
+
+def test_basic_streak_calculation(db_session):
     """Test basic streak calculation with consecutive days"""
     print("\\n🧪 Testing basic streak calculation...")
     
     user_id = setup_test_database()
     
-    with app.app_context():
-        calculator = StreakCalculator()
-        
-        # Create study sessions for 5 consecutive days ending today
-        today = calculator.get_local_date()
-        for i in range(5):
-            session_date = today - timedelta(days=4-i)
-            create_test_session(user_id, session_date, duration_minutes=30)
-            print(f"  ✓ Created session for {session_date}")
-        
-        # Test streak calculation
-        current_streak, start_date = calculator.calculate_current_streak(user_id)
-        longest_streak, longest_start, longest_end = calculator.calculate_longest_streak(user_id)
-        
-        print(f"  📊 Current streak: {current_streak} days (started {start_date})")
-        print(f"  🏆 Longest streak: {longest_streak} days")
-        
-        assert current_streak == 5, f"Expected 5-day streak, got {current_streak}"
-        assert longest_streak == 5, f"Expected 5-day longest streak, got {longest_streak}"
-        print("  ✅ Basic streak calculation passed!")
+    calculator = _CALCULATOR
+    
+    # Create study sessions for 5 consecutive days ending today
+    today = calculator.get_local_date()
+    base_ord = today.toordinal() - 4
+    session_dates = [date.fromordinal(base_ord + i) for i in range(5)]
+    create_test_sessions(user_id, [(session_date, 30) for session_date in session_dates])
+    for session_date in session_dates:
+        print(f"  ✓ Created session for {session_date}")
+    
+    # Test streak calculation
+    current_streak, start_date = calculator.calculate_current_streak(user_id)
+    longest_streak, longest_start, longest_end = calculator.calculate_longest_streak(user_id)
+    
+    print(f"  📊 Current streak: {current_streak} days (started {start_date})")
+    print(f"  🏆 Longest streak: {longest_streak} days")
+    
+    assert current_streak == 5, f"Expected 5-day streak, got {current_streak}"
+    assert longest_streak == 5, f"Expected 5-day longest streak, got {longest_streak}"
+    print("  ✅ Basic streak calculation passed!")
 
-def test_minimum_study_time():
+def test_minimum_study_time(db_session):
     """Test minimum study time requirements"""
     print("\\n🧪 Testing minimum study time requirements...")
     
     user_id = setup_test_database()
     
-    with app.app_context():
-        calculator = StreakCalculator()
-        today = calculator.get_local_date()
-        
-        # Create sessions with varying durations
-        create_test_session(user_id, today - timedelta(days=2), duration_minutes=30)  # Valid
-        create_test_session(user_id, today - timedelta(days=1), duration_minutes=3)   # Too short
-        create_test_session(user_id, today, duration_minutes=25)                       # Valid
-        
-        current_streak, _ = calculator.calculate_current_streak(user_id)
-        
-        # Should only count days with >= 5 minutes (so streak should be 1, not 2)
-        print(f"  📊 Current streak with min time filter: {current_streak} days")
-        assert current_streak == 1, f"Expected 1-day streak (yesterday too short), got {current_streak}"
-        print("  ✅ Minimum study time test passed!")
+    calculator = _CALCULATOR
+    today = calculator.get_local_date()
+    yesterday = _days_before(today, 1)
+    two_days_ago = _days_before(today, 2)
+    
+    # Create sessions with varying durations
+    create_test_sessions(user_id, [
+        (two_days_ago, 30),  # Valid
+        (yesterday, 3),      # Too short
+        (today, 25),         # Valid
+    ])
+    
+    current_streak, _ = calculator.calculate_current_streak(user_id)
+    
+    # Should only count days with >= 5 minutes (so streak should be 1, not 2)
+    print(f"  📊 Current streak with min time filter: {current_streak} days")
+    assert current_streak == 1, f"Expected 1-day streak (yesterday too short), got {current_streak}"
+    print("  ✅ Minimum study time test passed!")
 
-def test_streak_grace_period():
+def test_streak_grace_period(db_session):
     """Test grace period for streak continuation"""
     print("\\n🧪 Testing streak grace period...")
     
     user_id = setup_test_database()
-    calculator = StreakCalculator()
+    calculator = _CALCULATOR
     today = calculator.get_local_date()
+    yesterday = _days_before(today, 1)
+    two_days_ago = _days_before(today, 2)
     
     # Create sessions for yesterday but not today
-    create_test_session(user_id, today - timedelta(days=2), duration_minutes=25)
-    create_test_session(user_id, today - timedelta(days=1), duration_minutes=25)
-    # No session today
+    create_test_sessions(user_id, [
+        (two_days_ago, 25),
+        (yesterday, 25),
+        # No session today
+    ])
     
     current_streak, _ = calculator.calculate_current_streak(user_id)
     
@@ -113,20 +143,25 @@ def test_streak_grace_period():
     assert current_streak == 2, f"Expected 2-day streak (grace period), got {current_streak}"
     print("  ✅ Grace period test passed!")
 
-def test_broken_streak():
+def test_broken_streak(db_session):
     """Test detection of broken streaks"""
     print("\\n🧪 Testing broken streak detection...")
     
     user_id = setup_test_database()
-    calculator = StreakCalculator()
+    calculator = _CALCULATOR
     today = calculator.get_local_date()
+    yesterday = _days_before(today, 1)
+    three_days_ago = _days_before(today, 3)
+    four_days_ago = _days_before(today, 4)
     
     # Create sessions with a gap
-    create_test_session(user_id, today - timedelta(days=4), duration_minutes=25)
-    create_test_session(user_id, today - timedelta(days=3), duration_minutes=25)
-    # Gap on day -2
-    create_test_session(user_id, today - timedelta(days=1), duration_minutes=25)
-    create_test_session(user_id, today, duration_minutes=25)
+    create_test_sessions(user_id, [
+        (four_days_ago, 25),
+        (three_days_ago, 25),
+        # Gap on day -2
+        (yesterday, 25),
+        (today, 25),
+    ])
     
     current_streak, _ = calculator.calculate_current_streak(user_id)
     longest_streak, _, _ = calculator.calculate_longest_streak(user_id)
@@ -138,93 +173,117 @@ def test_broken_streak():
     assert longest_streak == 2, f"Expected 2-day longest streak, got {longest_streak}"
     print("  ✅ Broken streak test passed!")
 
-def test_streak_status_messages():
+# (sessions_data, expected_status, description); sessions_data holds (days_ago, minutes)
+# "broken_today" needs a zero current streak while yesterday still qualifies, but the grace
+# period always counts yesterday, so no session data reaches it; a two-day gap is "no_streak"
+STATUS_SCENARIOS = (
+    ((), "no_streak", "No sessions"),
+    (((1, 25),), "at_risk", "Only yesterday (at risk)"),
+    (((2, 25),), "no_streak", "Only two days ago"),
+    (((0, 25),), "active_studied_today", "Only today"),
+    (((1, 25), (0, 25)), "active_studied_today", "Two consecutive days"),
+)
+
+@pytest.mark.parametrize("sessions_data,expected_status,description", STATUS_SCENARIOS)
+def test_streak_status_messages(db_session, sessions_data, expected_status, description):
     """Test streak status messages and user feedback"""
-    print("\\n🧪 Testing streak status messages...")
+    print(f"\\n🧪 Testing streak status messages ({description})...")
     
     user_id = setup_test_database()
-    calculator = StreakCalculator()
+    calculator = _CALCULATOR
     today = calculator.get_local_date()
     
-    # Test various scenarios
-    scenarios = [
-        # (sessions_data, expected_status, description)
-        ([], "no_streak", "No sessions"),
-        ([(today - timedelta(days=1), 25)], "broken_today", "Only yesterday"),
-        ([(today, 25)], "active_studied_today", "Only today"),
-        ([(today - timedelta(days=1), 25), (today, 25)], "active_studied_today", "Two consecutive days"),
-        ([(today - timedelta(days=1), 25)], "broken_today", "Yesterday only (at risk)"),
-    ]
-    
-    for i, (sessions_data, expected_status, description) in enumerate(scenarios):
-        # Reset database for each test
-        user_id = setup_test_database()
-        
-        # Create sessions
-        for session_date, duration in sessions_data:
-            create_test_session(user_id, session_date, duration)
-        
-        # Get status
-        with app.app_context():
-            status = get_streak_status(user_id)
-        
-        print(f"  📝 Scenario {i+1} ({description}): {status['status']} - '{status['message']}'")
-        
-        # Note: We're testing that it returns a valid status, exact matching depends on implementation details
-        assert 'status' in status, f"Status missing in scenario {i+1}"
-        assert 'message' in status, f"Message missing in scenario {i+1}"
+    # Create sessions
+    create_test_sessions(user_id, [(_days_before(today, days_ago), minutes)
+                                   for days_ago, minutes in sessions_data])
+    
+    # Get status
+    status = get_streak_status(user_id)
+    
+    print(f"  📝 {description}: {status['status']} - '{status['message']}'")
     
+    assert 'status' in status, f"Status missing in scenario '{description}'"
+    assert 'message' in status, f"Message missing in scenario '{description}'"
+    assert status['status'] == expected_status, f"Expected '{expected_status}', got '{status['status']}' in scenario '{description}'"
     print("  ✅ Status message test passed!")
 
-def test_multiple_sessions_per_day():
+def test_multiple_sessions_per_day(db_session):
     """Test handling multiple study sessions in one day"""
     print("\\n🧪 Testing multiple sessions per day...")
     
     user_id = setup_test_database()
-    calculator = StreakCalculator()
+    calculator = _CALCULATOR
     today = calculator.get_local_date()
     
     # Create multiple sessions on the same day
-    create_test_session(user_id, today, duration_minutes=15, subject="Math")
-    create_test_session(user_id, today, duration_minutes=20, subject="Science")
-    create_test_session(user_id, today, duration_minutes=10, subject="English")
+    create_test_sessions(user_id, [
+        (today, 15, "Math"),
+        (today, 20, "Science"),
+        (today, 10, "English"),
+    ])
     
-    has_valid_day, total_minutes = calculator.has_valid_study_day(user_id, today)
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # The fixture's SAVEPOINTs aren't part of the lookup
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+    
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        has_valid_day, total_minutes = calculator.has_valid_study_day(user_id, today)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+    
+    # Same total straight from SQL; every session here clears the minimum, so no duration filter
+    sql_total = db.session.query(
+        func.coalesce(func.sum(StudySession.duration_minutes), 0)
+    ).filter(
+        StudySession.user_id == user_id,
+        StudySession.session_date == today,
+        StudySession.completed == True
+    ).scalar()
     
     print(f"  📊 Multiple sessions total: {total_minutes} minutes")
     print(f"  ✓ Valid study day: {has_valid_day}")
     
     assert has_valid_day, "Should be a valid study day with multiple sessions"
     assert total_minutes == 45, f"Expected 45 total minutes, got {total_minutes}"
+    assert total_minutes == sql_total, f"Calculator total {total_minutes} != SQL total {sql_total}"
+    # The day's minutes should be summed by one aggregate query, not by loading sessions
+    assert len(statements) == 1, f"Expected 1 query for the day total, got {len(statements)}"
     print("  ✅ Multiple sessions test passed!")
 
-def test_update_streak_integration():
+def test_update_streak_integration(db_session):
     """Test the update_streak function integration"""
     print("\\n🧪 Testing update_streak integration...")
     
     user_id = setup_test_database()
-    calculator = StreakCalculator()
+    calculator = _CALCULATOR
     today = calculator.get_local_date()
+    yesterday = _days_before(today, 1)
     
     # Create initial sessions
-    create_test_session(user_id, today - timedelta(days=1), duration_minutes=25)
-    create_test_session(user_id, today, duration_minutes=30)
+    create_test_sessions(user_id, [
+        (yesterday, 25),
+        (today, 30),
+    ])
     
     # Update streak
-    with app.app_context():
-        from db_utils import update_streak
-        result = update_streak(user_id)
+    from db_utils import update_streak
+    result = update_streak(user_id)
     
-    print(f"  📊 Streak update result: {json.dumps(result, indent=2)}")
+    if VERBOSE:
+        print(f"  📊 Streak update result: {json.dumps(result, indent=2)}")
+    else:
+        print(f"  📊 Streak update result: {result.get('current_streak')} days")
     
     assert 'current_streak' in result, "Result should contain current_streak"
     assert result['current_streak'] == 2, f"Expected 2-day streak, got {result['current_streak']}"
     
     # Verify database record was created/updated
-    with app.app_context():
-        active_streak = Streak.query.filter_by(user_id=user_id, is_active=True).first()
-        assert active_streak is not None, "Should have an active streak record"
-        assert active_streak.current_days == 2, f"DB record should show 2 days, got {active_streak.current_days}"
+    active_streak = get_current_streak(user_id)
+    assert active_streak is not None, "Should have an active streak record"
+    assert active_streak.current_days == 2, f"DB record should show 2 days, got {active_streak.current_days}"
     
     print("  ✅ Update streak integration test passed!")
 
@@ -233,26 +292,22 @@ def run_all_tests():
     print("🚀 Starting Phase 4 Streak Calculation Tests...")
     print("=" * 60)
     
-    try:
-        test_basic_streak_calculation()
-        test_minimum_study_time()
-        test_streak_grace_period()
-        test_broken_streak()
-        test_streak_status_messages()
-        test_multiple_sessions_per_day()
-        test_update_streak_integration()
-        
-        print("\\n" + "=" * 60)
+    # The tests rely on the fixtures in conftest.py, so let pytest drive them
+    args = ["-q", __file__]
+    # pytest-xdist is optional; with it the tests spread across worker processes,
+    # each with its own in-memory database
+    if importlib.util.find_spec("xdist") is not None:
+        args[:0] = ["-n", "auto"]
+    success = pytest.main(args) == 0
+    
+    print("\\n" + "=" * 60)
+    if success:
         print("🎉 All streak calculation tests passed!")
         print("✅ Phase 4 streak algorithms are working correctly!")
-        
-    except Exception as e:
-        print(f"\\n❌ Test failed: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-    
-    return True
+    else:
+        print("❌ Some streak calculation tests failed")
+    
+    return success
 
 if __name__ == "__main__":
     success = run_all_tests()